@@ -2,17 +2,34 @@ from __future__ import annotations
 
 import importlib
 import os
-import pkgutil
-try:  # Allow importing this module without Flask installed
-    from flask import Flask, Blueprint
-except Exception:  # pragma: no cover - used only in minimal test envs
-    Flask = object  # type: ignore
-    Blueprint = object  # type: ignore
-from config import Config
+import time
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from flask import Flask
 
-def create_app(config_class: type[Config] = Config) -> Flask:
+    from config import Config
+
+# Blueprints registered by ``create_app``, as ``(module, attribute)`` pairs.
+# Importing ``app`` (e.g. for ``app.models`` in a Celery worker) must stay
+# cheap, so Flask, the config and the views are only loaded by the factory.
+BLUEPRINTS = (
+    ("app.auth", "auth_bp"),
+    ("app.views.projects", "projects_bp"),
+    ("app.views.scheduler", "scheduler_bp"),
+    ("app.views.metrics", "metrics_bp"),
+)
+
+
+def create_app(config_class: type[Config] | None = None) -> Flask:
     """Application factory."""
+    from flask import Flask
+
+    if config_class is None:
+        from config import Config
+
+        config_class = Config
+
     # Determine paths to static and template folders relative to this file
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
     static_folder = os.path.join(base_dir, "static")
@@ -24,34 +41,56 @@ def create_app(config_class: type[Config] = Config) -> Flask:
     app.config.setdefault("CELERY_BROKER_URL", config_class.BROKER_URL)
     app.config.setdefault("CELERY_RESULT_BACKEND", config_class.CELERY_RESULT_BACKEND)
 
+    if config_class.DRIVE_MIRROR_ENABLED:
+        from .drive_client import use_mirror
+        from .drive_mirror import DriveMirror
+
+        use_mirror(DriveMirror(config_class.DRIVE_MIRROR_PATH), config_class.DRIVE_MIRROR_MAX_AGE)
+
+    if config_class.METRICS_ENABLED:
+        _init_metrics(app, config_class)
+    if config_class.SLOW_REQUEST_SECONDS > 0:
+        from .profiling import SlowRequestProfiler
+
+        SlowRequestProfiler(
+            config_class.SLOW_REQUEST_SECONDS, config_class.PROFILE_SAMPLE_INTERVAL
+        ).init_app(app)
+
     _register_blueprints(app)
     return app
 
 
+def _init_metrics(app: Flask, config_class: type[Config]) -> None:
+    """Enable metrics and time every request."""
+    from flask import g, request
+
+    from . import metrics
+
+    metrics.setup(config_class.METRICS_DIR)
+
+    @app.before_request
+    def _start_timer() -> None:
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            metrics.observe(
+                "http_request_seconds",
+                time.perf_counter() - started,
+                endpoint=request.endpoint or "unknown",
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
+
+
 def _register_blueprints(app: Flask) -> None:
-    """Register application blueprints if their modules are available."""
-    # Attempt to register blueprint defined in auth.py
-    try:
-        module = importlib.import_module("app.auth")
-    except ImportError:
-        module = None
-    if module is not None:
-        for attr in ("bp", "auth_bp"):
-            blueprint = getattr(module, attr, None)
-            if isinstance(blueprint, Blueprint):
-                app.register_blueprint(blueprint)
-                break
-
-    # Register any blueprints in the views package
-    views_path = os.path.join(os.path.dirname(__file__), "views")
-    if os.path.isdir(views_path):
-        for _, name, _ in pkgutil.iter_modules([views_path]):
-            try:
-                mod = importlib.import_module(f"app.views.{name}")
-            except ImportError:
-                continue
-            for attr in ("bp", "blueprint", f"{name}_bp"):
-                blueprint = getattr(mod, attr, None)
-                if isinstance(blueprint, Blueprint):
-                    app.register_blueprint(blueprint)
-                    break
+    """Register the blueprints listed in ``BLUEPRINTS`` whose modules import."""
+    for module_name, attr in BLUEPRINTS:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        app.register_blueprint(getattr(module, attr))
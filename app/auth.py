@@ -1,15 +1,22 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
 import sqlite3
-from typing import Optional
+import threading
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
 
 from flask import Blueprint, current_app, redirect, request, session, url_for
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
 
+if TYPE_CHECKING:
+    # The Google auth libraries are slow to import; they are loaded on first use
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import Flow
+
+
+logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -23,11 +30,21 @@ SCOPES = [
 # Path to the SQLite database that stores OAuth credentials
 DB_PATH = os.path.join(os.path.dirname(__file__), "tokens.db")
 
+# Cached credentials are reused until they are this close to expiring
+REFRESH_MARGIN = timedelta(minutes=5)
+# Seconds to wait for another process that is refreshing an expired token
+REFRESH_LOCK_TIMEOUT = 30.0
+
+_cached_credentials: Optional[Credentials] = None
+_credentials_lock = threading.Lock()
+
 
 def _init_db() -> None:
     """Create the tokens table if it doesn't exist."""
     conn = sqlite3.connect(DB_PATH)
     try:
+        # WAL lets readers load the token while another process refreshes it
+        conn.execute("PRAGMA journal_mode=WAL")
         conn.execute(
             """CREATE TABLE IF NOT EXISTS tokens (
                 id INTEGER PRIMARY KEY,
@@ -39,36 +56,118 @@ def _init_db() -> None:
         conn.close()
 
 
+def _is_fresh(creds: Credentials) -> bool:
+    """Return True if ``creds`` stay valid for at least ``REFRESH_MARGIN``."""
+    if not creds.valid:
+        return False
+    # google-auth keeps ``expiry`` as a naive UTC datetime
+    return creds.expiry is None or creds.expiry - datetime.utcnow() > REFRESH_MARGIN
+
+
+def _unexpired(creds: Credentials) -> bool:
+    """Return True if ``creds`` hold a token that has not expired yet.
+
+    Unlike ``creds.valid`` this ignores google-auth's own early-refresh
+    threshold, so a token is used until it actually expires.
+    """
+    return bool(creds.token) and (creds.expiry is None or creds.expiry > datetime.utcnow())
+
+
+def _read_credentials(conn: sqlite3.Connection) -> Optional[Credentials]:
+    row = conn.execute("SELECT credentials FROM tokens WHERE id = 1").fetchone()
+    if row is None:
+        return None
+    from google.oauth2.credentials import Credentials
+
+    return Credentials.from_authorized_user_info(json.loads(row[0]), SCOPES)
+
+
+def _write_credentials(conn: sqlite3.Connection, creds: Credentials) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO tokens (id, credentials) VALUES (1, ?)",
+        (creds.to_json(),),
+    )
+
+
 def _store_credentials(creds: Credentials) -> None:
-    """Persist credentials in the SQLite database."""
+    """Persist credentials in the SQLite database and the process cache."""
+    global _cached_credentials
     _init_db()
-    data = creds.to_json()
     conn = sqlite3.connect(DB_PATH)
     try:
-        conn.execute("DELETE FROM tokens WHERE id = 1")
-        conn.execute("INSERT INTO tokens (id, credentials) VALUES (1, ?)", (data,))
+        _write_credentials(conn, creds)
         conn.commit()
     finally:
         conn.close()
+    _cached_credentials = creds
+
+
+def _refresh_credentials(creds: Credentials) -> Credentials:
+    """Refresh ``creds`` so that only one process talks to the token endpoint.
+
+    The refresh runs inside a ``BEGIN IMMEDIATE`` transaction on the tokens
+    database, which admits one writer at a time. Processes that queue on the
+    lock re-read the token once it is released and use it if the holder
+    already refreshed it. Credentials that are still valid are being
+    refreshed early; if another process holds the lock, or the refresh
+    fails, they are returned as-is so the caller is never held up by it.
+    """
+    original = creds
+    still_valid = _unexpired(creds)
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=0 if still_valid else REFRESH_LOCK_TIMEOUT,
+        isolation_level=None,
+    )
+    try:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            if still_valid:
+                return creds
+            raise
+        try:
+            stored = _read_credentials(conn)
+            if stored is not None and _is_fresh(stored):
+                conn.execute("COMMIT")
+                return stored
+            creds = stored if stored is not None and stored.refresh_token else creds
+            from google.auth.transport.requests import Request
+
+            creds.refresh(Request())
+            _write_credentials(conn, creds)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            if not still_valid:
+                raise
+            logger.warning("Early token refresh failed; using current token", exc_info=True)
+            return original
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return creds
 
 
 def _load_credentials() -> Optional[Credentials]:
-    """Load stored credentials from the database if available."""
+    """Load stored credentials from the database if available.
+
+    Credentials that are expired or about to expire are refreshed through
+    ``_refresh_credentials``.
+    """
     if not os.path.exists(DB_PATH):
         return None
     conn = sqlite3.connect(DB_PATH)
     try:
-        cur = conn.execute("SELECT credentials FROM tokens WHERE id = 1")
-        row = cur.fetchone()
+        creds = _read_credentials(conn)
     finally:
         conn.close()
-    if row is None:
+    if creds is None:
         return None
-    data = json.loads(row[0])
-    creds = Credentials.from_authorized_user_info(data, SCOPES)
-    if creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-        _store_credentials(creds)
+    if not _is_fresh(creds) and creds.refresh_token:
+        creds = _refresh_credentials(creds)
     return creds
 
 
@@ -83,6 +182,8 @@ def _flow(state: Optional[str] = None) -> Flow:
             "redirect_uris": [url_for("auth.oauth2_callback", _external=True)],
         }
     }
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_config(client_config, scopes=SCOPES, state=state)
     flow.redirect_uri = url_for("auth.oauth2_callback", _external=True)
     return flow
@@ -113,5 +214,18 @@ def oauth2_callback() -> redirect:
 
 
 def get_credentials() -> Optional[Credentials]:
-    """Retrieve stored credentials, refreshing if needed."""
-    return _load_credentials()
+    """Retrieve stored credentials, refreshing if needed.
+
+    Credentials are cached per process and only reloaded from the database
+    once they come within ``REFRESH_MARGIN`` of expiring.
+    """
+    global _cached_credentials
+    creds = _cached_credentials
+    if creds is not None and _is_fresh(creds):
+        return creds
+    with _credentials_lock:
+        creds = _cached_credentials
+        if creds is None or not _is_fresh(creds):
+            creds = _load_credentials()
+            _cached_credentials = creds
+    return creds
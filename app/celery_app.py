@@ -10,6 +10,26 @@ celery_app = Celery(
     backend=Config.CELERY_RESULT_BACKEND,
 )
 
+# Publish due uploads on a short tick instead of holding far-off ETA tasks
+celery_app.conf.beat_schedule = {
+    "dispatch-due-uploads": {
+        "task": "tasks.scheduler.dispatch_due_uploads",
+        "schedule": float(Config.DISPATCH_INTERVAL_SECONDS),
+    },
+}
+
+if Config.DRIVE_MIRROR_ENABLED:
+    celery_app.conf.beat_schedule["sync-drive-mirror"] = {
+        "task": "tasks.drive_sync.sync_drive_mirror",
+        "schedule": float(Config.DRIVE_SYNC_INTERVAL_SECONDS),
+    }
+
+if Config.METRICS_ENABLED:
+    from . import metrics
+
+    metrics.setup(Config.METRICS_DIR)
+    metrics.instrument_celery()
+
 # Automatically discover tasks from the "tasks" package
 celery_app.autodiscover_tasks(["tasks"])
 
@@ -1,37 +1,185 @@
 from __future__ import annotations
 
-import io
+import hashlib
+import json
+import logging
 import os
-from typing import Iterable, List
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import PurePosixPath
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple
 
-from googleapiclient.discovery import build
+# ``googleapiclient.discovery`` is slow to import and only loaded when the
+# first client is built; the errors module is cheap
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload
 
-from .auth import get_credentials
+from . import metrics, models, ratelimit, validators
+from .drive_mirror import DriveMirror
+from .ratelimit import RateLimiter
+from .staging import StagingCache
 
 
+logger = logging.getLogger(__name__)
+
 FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
 
+# Number of files fetched concurrently by ``download_folder``
+DEFAULT_DOWNLOAD_WORKERS = 4
+
+# Bounds of the process-wide path -> folder ID cache
+PATH_CACHE_SIZE = 1024
+PATH_CACHE_TTL = 300.0
+
+# Upper bound on the length of an OR-combined "in parents" query
+MAX_QUERY_LENGTH = 4000
+# Maximum number of calls Drive accepts in one batch HTTP request
+MAX_BATCH_SIZE = 100
+# Items requested per files().list page
+LIST_PAGE_SIZE = 1000
+# Fields requested for every item returned by ``walk_tree``
+TREE_FIELDS = "id, name, mimeType, md5Checksum, size, modifiedTime"
+
+# Bytes requested per HTTP Range request while downloading a file. A whole
+# chunk is buffered in memory, so this is also the memory used per download
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+# Smallest chunk used when a memory budget is split between workers
+MIN_CHUNK_SIZE = 256 * 1024
+# Consecutive transient failures tolerated for a single chunk
+DOWNLOAD_RETRIES = 3
+# Seconds before the first retry of a failed chunk; doubled for each further
+# retry and jittered so parallel downloads do not retry in lockstep
+DOWNLOAD_RETRY_BACKOFF = 0.5
+# Suffix of in-progress downloads; renamed away once the file is complete
+PART_SUFFIX = ".part"
+
+# File kept in a download destination describing the files synced into it
+MANIFEST_NAME = ".drive-manifest.json"
+MANIFEST_FIELDS = ("id", "md5Checksum", "size", "modifiedTime")
+
+# Idle Drive clients kept for reuse, as ``(credentials, service)`` pairs
+SERVICE_POOL_SIZE = 8
+_service_pool: List[Tuple[object, object]] = []
+_service_pool_lock = threading.Lock()
+
+# Paces every Drive call made by this process; shared with other processes
+# through its database file
+_rate_limiter: RateLimiter | None = RateLimiter()
+
+
+class Progress(NamedTuple):
+    """Progress of one file download, passed to ``progress`` callbacks."""
+
+    file_id: str
+    path: str
+    done: int
+    total: int | None
+    # Bytes per second transferred so far in this attempt
+    rate: float
+
+
+ProgressCallback = Callable[[Progress], None]
+
+
+class DownloadError(RuntimeError):
+    """Raised after a folder download when one or more files failed.
+
+    ``failures`` holds ``(file_id, dest_path, exception)`` tuples for every
+    file that could not be fetched; all other files were downloaded.
+    """
+
+    def __init__(self, failures: List[Tuple[str, str, Exception]]):
+        self.failures = failures
+        shown = ", ".join(f"{dest} ({err})" for _, dest, err in failures[:3])
+        if len(failures) > 3:
+            shown += f" and {len(failures) - 3} more"
+        super().__init__(f"Failed downloading {len(failures)} file(s): {shown}")
+
+
+def _build_service(creds):
+    """Build a Drive API client from the bundled static discovery document."""
+    from googleapiclient.discovery import build
+
+    return build(
+        "drive", "v3", credentials=creds, static_discovery=True, cache_discovery=False
+    )
+
+
+@contextmanager
+def _drive_service():
+    """Check out an authorized Drive API client for the duration of a block.
+
+    Clients are pooled per process and used by one thread at a time, since
+    the httplib2 transport behind them is not thread-safe. Pooled clients
+    built from credentials that have since been replaced are discarded.
+    """
+    # Imported here so workers do not load Flask and the OAuth stack up front
+    from .auth import get_credentials
 
-def _get_service():
-    """Return an authorized Drive API client."""
     creds = get_credentials()
     if creds is None:
         raise RuntimeError("Google credentials are not available")
-    return build("drive", "v3", credentials=creds)
+    service = None
+    with _service_pool_lock:
+        while _service_pool:
+            pooled_creds, pooled = _service_pool.pop()
+            if pooled_creds is creds:
+                service = pooled
+                break
+    if service is None:
+        service = _build_service(creds)
+    try:
+        yield service
+    finally:
+        with _service_pool_lock:
+            if len(_service_pool) < SERVICE_POOL_SIZE:
+                _service_pool.append((creds, service))
+
+
+def use_rate_limiter(limiter: RateLimiter | None) -> None:
+    """Send Drive calls through ``limiter``, or unpaced with ``None``."""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def _call(func, cost: int = 1, op: str = "request"):
+    """Run a function issuing ``cost`` Drive calls through the rate limiter.
+
+    The time spent, including any wait for the limiter, is recorded in the
+    ``drive_request_seconds`` histogram under ``op``.
+    """
+    limiter = _rate_limiter
+    with metrics.timer("drive_request_seconds", op=op):
+        if limiter is None:
+            return func()
+        return limiter.call(func, cost)
+
+
+def _execute(request):
+    """Execute a Drive API request through the rate limiter."""
+    return _call(request.execute, op=getattr(request, "methodId", "request"))
+
+
+def _quote(value: str) -> str:
+    """Escape ``value`` for use inside a single-quoted Drive query string."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def _child_query(parent_id: str, name: str, folders_only: bool = True) -> str:
+    query = f"'{parent_id}' in parents and name='{_quote(name)}' and trashed=false"
+    if folders_only:
+        query += f" and mimeType='{FOLDER_MIME_TYPE}'"
+    return query
 
 
 def _find_child_folder(service, parent_id: str, name: str) -> str | None:
     """Return the ID of a child folder with the given name under parent."""
-    query = (
-        f"'{parent_id}' in parents and "
-        f"mimeType='{FOLDER_MIME_TYPE}' and name='{name}' and trashed=false"
-    )
-    response = (
-        service.files()
-        .list(q=query, spaces="drive", fields="files(id,name)")
-        .execute()
+    response = _execute(
+        service.files().list(q=_child_query(parent_id, name), spaces="drive", fields="files(id,name)")
     )
     files = response.get("files", [])
     if not files:
@@ -39,87 +187,896 @@ def _find_child_folder(service, parent_id: str, name: str) -> str | None:
     return files[0]["id"]
 
 
-def _resolve_path(service, path: str) -> str:
-    """Resolve a '/' separated Drive path to a folder ID."""
+class PathCache:
+    """Thread-safe LRU cache mapping Drive path prefixes to folder IDs.
+
+    Entries expire ``ttl`` seconds after being stored and the least recently
+    used entry is dropped once ``maxsize`` entries are held.
+    """
+
+    def __init__(self, maxsize: int = PATH_CACHE_SIZE, ttl: float = PATH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, folder_id: str) -> None:
+        with self._lock:
+            self._entries[key] = (folder_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str | None = None) -> None:
+        """Drop ``key`` and every path below it, or everything if ``key`` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                return
+            prefix = key + "/"
+            for cached in [k for k in self._entries if k == key or k.startswith(prefix)]:
+                del self._entries[cached]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+_path_cache = PathCache()
+
+# Local mirror of the projects tree, enabled with ``use_mirror``
+_mirror: DriveMirror | None = None
+_mirror_max_age: float | None = None
+
+
+def _path_key(path: str) -> str:
+    return "/".join(p for p in path.strip("/").split("/") if p)
+
+
+def _is_not_found(err: HttpError) -> bool:
+    return getattr(err.resp, "status", None) == 404
+
+
+@metrics.timed("drive_resolve_path_seconds")
+def _resolve_path(service, path: str, use_cache: bool = True) -> str:
+    """Resolve a '/' separated Drive path to a folder ID.
+
+    Paths below the root of a warm Drive mirror are answered from the
+    mirror. Otherwise every prefix of ``path`` is looked up in, and stored
+    to, the process-wide path cache. If a lookup below a cached folder
+    fails, the cached entries are assumed stale and the path is resolved
+    again from the root, bypassing both caches.
+    """
+    mirror = _warm_mirror() if use_cache else None
+    if mirror is not None:
+        folder_id = mirror.resolve(path)
+        if folder_id is not None:
+            return folder_id
     parts = [p for p in path.strip("/").split("/") if p]
     folder_id = "root"
-    for part in parts:
-        child = _find_child_folder(service, folder_id, part)
+    from_cache = False
+    for depth, part in enumerate(parts, start=1):
+        prefix = "/".join(parts[:depth])
+        cached = _path_cache.get(prefix) if use_cache else None
+        if cached is not None:
+            folder_id = cached
+            from_cache = True
+            continue
+        try:
+            child = _find_child_folder(service, folder_id, part)
+        except HttpError as err:
+            if not (from_cache and _is_not_found(err)):
+                raise
+            child = None
         if child is None:
+            if from_cache:
+                _path_cache.invalidate("/".join(parts[: depth - 1]))
+                return _resolve_path(service, path, use_cache=False)
             raise FileNotFoundError(f"Drive folder '{path}' not found")
+        _path_cache.set(prefix, child)
         folder_id = child
     return folder_id
 
 
-def list_folders(path: str) -> List[dict]:
-    """Return all child folders of the given Drive path."""
-    service = _get_service()
-    parent_id = _resolve_path(service, path)
-    query = (
-        f"'{parent_id}' in parents and mimeType='{FOLDER_MIME_TYPE}' "
-        "and trashed=false"
-    )
-    page_token = None
-    folders: List[dict] = []
-    while True:
-        response = (
-            service.files()
-            .list(
-                q=query,
-                spaces="drive",
-                fields="nextPageToken, files(id, name)",
-                pageToken=page_token,
+def _with_folder(service, path: str, func):
+    """Call ``func`` with the folder ID of ``path``.
+
+    A 404 from ``func`` means the cached ID is stale: the path is resolved
+    again without the cache and ``func`` is retried once.
+    """
+    try:
+        return func(_resolve_path(service, path))
+    except HttpError as err:
+        if not _is_not_found(err):
+            raise
+    _path_cache.invalidate(_path_key(path))
+    return func(_resolve_path(service, path, use_cache=False))
+
+
+def use_mirror(mirror: DriveMirror | None, max_age: float | None = None) -> None:
+    """Answer path resolution and folder listings from ``mirror``.
+
+    The mirror is consulted only while it has synced within ``max_age``
+    seconds; otherwise, or with ``mirror=None``, live API calls are used.
+    """
+    global _mirror, _mirror_max_age
+    _mirror = mirror
+    _mirror_max_age = max_age
+
+
+def _warm_mirror() -> DriveMirror | None:
+    mirror = _mirror
+    if mirror is not None and mirror.is_warm(_mirror_max_age):
+        return mirror
+    return None
+
+
+def sync_mirror(mirror: DriveMirror, path: str) -> Dict[str, int]:
+    """Bring ``mirror`` up to date with the Drive tree below ``path``.
+
+    The first sync, or a sync for a different root, lists the whole tree.
+    Later syncs apply the ``changes.list`` feed and list only folders that
+    were moved into the tree. Returns counts of ``listed`` items and
+    ``changed_folders`` listed from the feed.
+    """
+    with _drive_service() as service:
+        if mirror.page_token is None or mirror.root_path != _path_key(path):
+            token = _execute(service.changes().getStartPageToken())["startPageToken"]
+            root_id = _resolve_path(service, path, use_cache=False)
+            items = walk_tree(service, root_id, index_assets=False)
+            mirror.reset(root_id, path, items, token)
+            return {"listed": len(items), "changed_folders": 0}
+        listed = 0
+        new_folders = mirror.apply_changes(service, execute=_execute)
+        for folder_id in new_folders:
+            items = walk_tree(service, folder_id, index_assets=False)
+            mirror.add_items(items)
+            listed += len(items)
+    return {"listed": listed, "changed_folders": len(new_folders)}
+
+
+def _collect_metrics() -> None:
+    metrics.set_gauge("drive_path_cache_entries", _path_cache.stats()["size"])
+    limiter = _rate_limiter
+    if limiter is not None:
+        metrics.set_gauge("drive_rate_limit_per_second", limiter.stats()["rate"])
+
+
+metrics.register_collector(_collect_metrics)
+
+
+def path_cache_stats() -> Dict[str, int]:
+    """Return hit/miss counters and the current size of the path cache."""
+    return _path_cache.stats()
+
+
+def invalidate_path_cache(path: str | None = None) -> None:
+    """Forget cached folder IDs for ``path`` (and below), or for all paths."""
+    _path_cache.invalidate(None if path is None else _path_key(path))
+
+
+def _execute_batch(service, requests: List) -> List[Tuple[dict | None, Exception | None]]:
+    """Execute Drive API requests through batch HTTP requests.
+
+    Requests are sent in chunks of ``MAX_BATCH_SIZE``. The result holds one
+    ``(response, error)`` pair per request, in the order they were given;
+    exactly one element of each pair is set. If a whole batch fails, or
+    Drive sends no part for a call, the error is reported for each call
+    affected. Calls that Drive throttled inside a batch are sent again once
+    the rate limiter allows it.
+    """
+    results: List[Tuple[dict | None, Exception | None]] = [(None, None)] * len(requests)
+
+    def callback(request_id: str, response: dict, exception: Exception | None) -> None:
+        results[int(request_id)] = (response, exception)
+
+    pending = list(range(len(requests)))
+    attempts = 0
+    while pending:
+        for start in range(0, len(pending), MAX_BATCH_SIZE):
+            chunk = pending[start:start + MAX_BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                results[index] = (None, None)
+                batch.add(requests[index], request_id=str(index))
+            try:
+                _call(batch.execute, len(chunk), op="batch")
+            except Exception as err:
+                failure: Exception = err
+            else:
+                failure = RuntimeError("Drive returned no response for a batched call")
+            for index in chunk:
+                if results[index] == (None, None):
+                    results[index] = (None, failure)
+        attempts += 1
+        limiter = _rate_limiter
+        pending = [i for i in pending if ratelimit.is_rate_limited(results[i][1])]
+        if not pending or limiter is None or attempts >= ratelimit.MAX_ATTEMPTS:
+            break
+        limiter.throttled()
+    return results
+
+
+def _batch_lookup(
+    service, queries: Dict[str, str], fields: str
+) -> Tuple[Dict[str, dict | None], Dict[str, Exception]]:
+    """Run one single-result ``files().list`` query per key in batches."""
+    keys = list(queries)
+    requests = [
+        service.files().list(
+            q=queries[key], spaces="drive", fields=f"files({fields})", pageSize=1
+        )
+        for key in keys
+    ]
+    found: Dict[str, dict | None] = {}
+    errors: Dict[str, Exception] = {}
+    for key, (response, error) in zip(keys, _execute_batch(service, requests)):
+        if error is not None:
+            errors[key] = error
+            continue
+        files = response.get("files", [])
+        found[key] = files[0] if files else None
+    return found, errors
+
+
+def find_child_folders(
+    path: str, names: Iterable[str]
+) -> Tuple[Dict[str, str | None], Dict[str, Exception]]:
+    """Look up many child folders of a Drive path in batched requests.
+
+    Returns ``(found, errors)``: ``found`` maps each name to its folder ID, or
+    ``None`` when no such folder exists, and ``errors`` maps the names whose
+    lookup failed to the raised exception.
+    """
+    with _drive_service() as service:
+        parent_id = _resolve_path(service, path)
+        queries = {name: _child_query(parent_id, name) for name in names}
+        found, errors = _batch_lookup(service, queries, "id, name")
+    key = _path_key(path)
+    for name, folder in found.items():
+        if folder is not None:
+            _path_cache.set(f"{key}/{name}" if key else name, folder["id"])
+    return {name: folder and folder["id"] for name, folder in found.items()}, errors
+
+
+def find_files(
+    folder_ids: Iterable[str], name: str, fields: str = TREE_FIELDS
+) -> Tuple[Dict[str, dict | None], Dict[str, Exception]]:
+    """Look up the file called ``name`` in each of many folders.
+
+    Used for example to fetch the ``metadata.json`` resource of every item
+    folder at once. Returns ``(found, errors)`` keyed by folder ID, in the
+    same shape as ``find_child_folders``.
+    """
+    queries = {
+        folder_id: _child_query(folder_id, name, folders_only=False)
+        for folder_id in folder_ids
+    }
+    with _drive_service() as service:
+        return _batch_lookup(service, queries, fields)
+
+
+def _parent_batches(parent_ids: List[str], reserved: int) -> Iterable[List[str]]:
+    """Split ``parent_ids`` into groups whose OR-combined query fits the limit."""
+    batch: List[str] = []
+    length = reserved
+    for parent_id in parent_ids:
+        clause = len(f"'{parent_id}' in parents or ")
+        if batch and length + clause > MAX_QUERY_LENGTH:
+            yield batch
+            batch = []
+            length = reserved
+        batch.append(parent_id)
+        length += clause
+    if batch:
+        yield batch
+
+
+def _list_children(
+    service, parent_ids: List[str], fields: str, extra_query: str = ""
+) -> Dict[str, List[dict]]:
+    """Return the children of several folders, grouped by parent ID.
+
+    As many parents as fit in one query are combined with ``or`` so a whole
+    level of the tree is usually listed with a single paginated request.
+    """
+    suffix = f" and trashed=false{extra_query}"
+    children: Dict[str, List[dict]] = {parent_id: [] for parent_id in parent_ids}
+    for batch in _parent_batches(parent_ids, len(suffix) + 2):
+        clauses = " or ".join(f"'{parent_id}' in parents" for parent_id in batch)
+        query = f"({clauses}){suffix}"
+        page_token = None
+        while True:
+            response = _execute(
+                service.files().list(
+                    q=query,
+                    spaces="drive",
+                    fields=f"nextPageToken, files({fields}, parents)",
+                    pageSize=LIST_PAGE_SIZE,
+                    pageToken=page_token,
+                )
             )
-            .execute()
+            metrics.inc("drive_list_pages_total")
+            for item in response.get("files", []):
+                for parent_id in item.get("parents", []):
+                    if parent_id in children:
+                        children[parent_id].append(item)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+    return children
+
+
+def walk_tree(
+    service,
+    folder_id: str,
+    fields: str = TREE_FIELDS,
+    folders_only: bool = False,
+    max_depth: int | None = None,
+    index_assets: bool = True,
+) -> List[dict]:
+    """List everything below ``folder_id`` one tree level at a time.
+
+    Each level is fetched with OR-combined parent queries and the hierarchy
+    is rebuilt locally, so the number of requests grows with the depth of
+    the tree rather than the number of folders. Every returned item gets a
+    ``path`` key holding its '/' separated path relative to ``folder_id``;
+    parents are listed before their children.
+
+    Unless ``index_assets`` is false, files listed with a checksum are
+    recorded in the duplicate-asset index of ``app.models`` under
+    ``folder_id``; callers listing above or below a project folder should
+    disable it so project associations are not overwritten.
+    """
+    extra_query = f" and mimeType='{FOLDER_MIME_TYPE}'" if folders_only else ""
+    paths = {folder_id: ""}
+    level = [folder_id]
+    depth = 0
+    items: List[dict] = []
+    while level and (max_depth is None or depth < max_depth):
+        children = _list_children(service, level, fields, extra_query)
+        next_level: List[str] = []
+        for parent_id in level:
+            for item in children[parent_id]:
+                parent_path = paths[parent_id]
+                item["path"] = f"{parent_path}/{item['name']}" if parent_path else item["name"]
+                items.append(item)
+                if item["mimeType"] == FOLDER_MIME_TYPE:
+                    paths[item["id"]] = item["path"]
+                    next_level.append(item["id"])
+        level = next_level
+        depth += 1
+    if index_assets:
+        _index_assets(items, folder_id)
+    return items
+
+
+def _index_assets(items: List[dict], folder_id: str) -> None:
+    """Record the checksums of listed files in the duplicate-asset index."""
+    try:
+        models.record_assets(items, folder_id)
+    except sqlite3.Error:
+        logger.warning("Could not index assets listed under %s", folder_id, exc_info=True)
+
+
+def list_folders(path: str) -> List[dict]:
+    """Return all child folders of the given Drive path.
+
+    Answered from the Drive mirror without API calls while it is warm.
+    """
+    mirror = _warm_mirror()
+    folder_id = mirror.resolve(path) if mirror is not None else None
+    if folder_id is not None:
+        return [
+            {"id": folder["id"], "name": folder["name"]}
+            for folder in mirror.children(folder_id, folders_only=True)
+        ]
+    with _drive_service() as service:
+        folders = _with_folder(
+            service,
+            path,
+            lambda parent_id: walk_tree(
+                service, parent_id, "id, name, mimeType", folders_only=True, max_depth=1
+            ),
         )
-        folders.extend(response.get("files", []))
-        page_token = response.get("nextPageToken")
-        if not page_token:
-            break
-    return folders
+    return [{"id": folder["id"], "name": folder["name"]} for folder in folders]
+
+
+def _fetch_range(request, start: int, end: int):
+    """Fetch bytes ``start``-``end`` (inclusive) of a media request."""
+    headers = dict(request.headers)
+    headers["range"] = f"bytes={start}-{end}"
+    resp, content = request.http.request(request.uri, method="GET", headers=headers)
+    if resp.status not in (200, 206):
+        raise HttpError(resp, content, uri=request.uri)
+    return resp, content
+
+
+def _total_from_response(resp, fallback: int | None) -> int | None:
+    """Return the full object size advertised by a (partial) response."""
+    content_range = resp.get("content-range", "")
+    total = content_range.rpartition("/")[2]
+    if total.isdigit():
+        return int(total)
+    return fallback
+
+
+def _retry_sleep(attempt: int) -> None:
+    """Wait before retry number ``attempt`` of a failed chunk."""
+    time.sleep(DOWNLOAD_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
 
 
-def _download_file(service, file_id: str, dest_path: str) -> None:
+def _iter_chunks(
+    request, file_id: str, offset: int, total: int | None, chunk_size: int
+) -> Iterator[Tuple[int, bytes, int | None]]:
+    """Yield ``(offset, data, total)`` for consecutive ranges of a media request.
+
+    Only one chunk of at most ``chunk_size`` bytes is held at a time. A chunk
+    normally starts where the previous one ended; if the server ignores the
+    Range header the whole body is yielded with offset 0. Transient errors
+    are retried up to ``DOWNLOAD_RETRIES`` times per chunk with jittered
+    exponential backoff.
+    """
+    retries = 0
+    while total is None or offset < total:
+        try:
+            resp, content = _call(
+                lambda: _fetch_range(request, offset, offset + chunk_size - 1),
+                op="media_range",
+            )
+        except HttpError as err:
+            status = err.resp.status
+            if status == 416 and total is None:
+                # Requested range starts at the end of the object
+                return
+            if status >= 500 and retries < DOWNLOAD_RETRIES:
+                retries += 1
+                _retry_sleep(retries)
+                continue
+            raise RuntimeError(f"Failed downloading file {file_id}: {err}") from err
+        except OSError:
+            if retries < DOWNLOAD_RETRIES:
+                retries += 1
+                _retry_sleep(retries)
+                continue
+            raise
+        retries = 0
+        if resp.status == 200:
+            # The server ignored the Range header and sent the whole body
+            offset = 0
+        end = offset + len(content)
+        total = _total_from_response(resp, end if resp.status == 200 else total)
+        yield offset, content, total
+        offset = end
+        if not content:
+            return
+
+
+def iter_file(
+    file_id: str, size: int | str | None = None, chunk_size: int = DOWNLOAD_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Stream the content of a Drive file in chunks of at most ``chunk_size``.
+
+    Meant for consumers that forward the data elsewhere without keeping a
+    local copy; memory use is bounded by the chunk size. A pooled Drive
+    client is held until the iterator is exhausted or closed.
+    """
+    with _drive_service() as service:
+        request = service.files().get_media(fileId=file_id)
+        total = int(size) if size is not None else None
+        position = 0
+        for offset, content, _ in _iter_chunks(request, file_id, 0, total, chunk_size):
+            # Drop bytes already yielded if the server restarted from the start
+            content = content[position - offset:]
+            position += len(content)
+            metrics.inc("drive_download_bytes_total", len(content))
+            if content:
+                yield content
+
+
+def _download_to_part(
+    request,
+    file_id: str,
+    part_path: str,
+    total: int | None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    progress: ProgressCallback | None = None,
+    fsync_bytes: int = 0,
+    progress_path: str | None = None,
+) -> None:
+    """Append the missing bytes of a media request to ``part_path``.
+
+    The transfer starts at the current size of ``part_path`` and every chunk
+    is flushed before the next one is requested, so an interrupted transfer
+    can be resumed from the last written offset. With ``fsync_bytes`` the
+    file is also fsynced whenever that many bytes were written since the
+    last sync, and once at the end. ``progress`` reports ``progress_path``
+    (default ``part_path``) as the file's path.
+    """
+    try:
+        offset = os.path.getsize(part_path)
+    except OSError:
+        offset = 0
+    if total is not None and offset > total:
+        offset = 0
+    started = time.monotonic()
+    transferred = 0
+    unsynced = 0
+    with open(part_path, "r+b" if offset else "wb") as fh:
+        fh.seek(offset)
+        fh.truncate()
+        for chunk_offset, content, total in _iter_chunks(
+            request, file_id, offset, total, chunk_size
+        ):
+            if chunk_offset != offset:
+                fh.seek(chunk_offset)
+                fh.truncate()
+            fh.write(content)
+            fh.flush()
+            offset = chunk_offset + len(content)
+            transferred += len(content)
+            metrics.inc("drive_download_bytes_total", len(content))
+            if fsync_bytes:
+                unsynced += len(content)
+                if unsynced >= fsync_bytes:
+                    os.fsync(fh.fileno())
+                    unsynced = 0
+            if progress is not None:
+                elapsed = time.monotonic() - started
+                rate = transferred / elapsed if elapsed > 0 else 0.0
+                progress(Progress(file_id, progress_path or part_path, offset, total, rate))
+        if fsync_bytes and unsynced:
+            os.fsync(fh.fileno())
+
+
+def _md5sum(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@metrics.timed("drive_download_file_seconds")
+def _download_file(
+    service,
+    file_id: str,
+    dest_path: str,
+    size: int | str | None = None,
+    md5_checksum: str | None = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    progress: ProgressCallback | None = None,
+    fsync_bytes: int = 0,
+    progress_path: str | None = None,
+) -> None:
+    """Download a Drive file to ``dest_path`` using resumable range requests.
+
+    Data is written to ``dest_path + ".part"`` and renamed into place once
+    complete. A leftover ``.part`` file from an earlier attempt is resumed
+    rather than fetched again. When ``md5_checksum`` is known the result is
+    verified, and a resumed file that does not match is fetched once more
+    from scratch. ``chunk_size``, ``progress`` and ``fsync_bytes`` are
+    passed to ``_download_to_part``; progress is reported for
+    ``progress_path``, which defaults to ``dest_path``.
+    """
     request = service.files().get_media(fileId=file_id)
     os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    with io.FileIO(dest_path, "wb") as fh:
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            try:
-                _, done = downloader.next_chunk()
-            except HttpError as err:
-                raise RuntimeError(f"Failed downloading file {file_id}: {err}") from err
+    part_path = dest_path + PART_SUFFIX
+    total = int(size) if size is not None else None
+    resumed = os.path.exists(part_path)
+    options = {
+        "chunk_size": chunk_size,
+        "progress": progress,
+        "fsync_bytes": fsync_bytes,
+        "progress_path": progress_path or dest_path,
+    }
+    _download_to_part(request, file_id, part_path, total, **options)
+    if md5_checksum and _md5sum(part_path) != md5_checksum:
+        os.remove(part_path)
+        if not resumed:
+            raise RuntimeError(f"Checksum mismatch downloading file {file_id}")
+        _download_to_part(request, file_id, part_path, total, **options)
+        if _md5sum(part_path) != md5_checksum:
+            os.remove(part_path)
+            raise RuntimeError(f"Checksum mismatch downloading file {file_id}")
+    os.replace(part_path, dest_path)
+
+
+def download_file(
+    file_id: str,
+    dest_path: str,
+    size: int | str | None = None,
+    md5_checksum: str | None = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    progress: ProgressCallback | None = None,
+    fsync_bytes: int = 0,
+) -> None:
+    """Download one Drive file to ``dest_path``.
 
+    At most ``chunk_size`` bytes are held in memory at a time. ``progress``
+    is called with a ``Progress`` after every chunk, and with
+    ``fsync_bytes`` the data is fsynced after every that many bytes.
+    """
+    with _drive_service() as service:
+        _download_file(
+            service, file_id, dest_path, size, md5_checksum, chunk_size, progress, fsync_bytes
+        )
+
+
+def _list_folder_files(service, folder_id: str, dest_dir: str) -> List[dict]:
+    """Create the local directory tree and return the files below ``folder_id``.
 
-def _download_folder_by_id(service, folder_id: str, dest_dir: str) -> None:
+    Each returned item is the Drive file resource with its ``path`` key
+    replaced by the local destination.
+    """
     os.makedirs(dest_dir, exist_ok=True)
-    query = f"'{folder_id}' in parents and trashed=false"
-    page_token = None
-    while True:
-        response = (
-            service.files()
-            .list(
-                q=query,
-                spaces="drive",
-                fields="nextPageToken, files(id, name, mimeType)",
-                pageToken=page_token,
-            )
-            .execute()
+    files: List[dict] = []
+    for item in walk_tree(service, folder_id):
+        target = os.path.join(dest_dir, *item["path"].split("/"))
+        if item["mimeType"] == FOLDER_MIME_TYPE:
+            os.makedirs(target, exist_ok=True)
+        else:
+            item["path"] = target
+            files.append(item)
+    return files
+
+
+# ---------------------------------------------------------------------------
+# Sync manifest
+# ---------------------------------------------------------------------------
+
+def _manifest_key(destination: str, dest_path: str) -> str:
+    return os.path.relpath(dest_path, destination).replace(os.sep, "/")
+
+
+def _load_manifest(destination: str) -> Dict[str, dict]:
+    """Return the manifest entries recorded for ``destination``, if any."""
+    try:
+        with open(os.path.join(destination, MANIFEST_NAME)) as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    return data.get("files", {})
+
+
+def _write_manifest(destination: str, entries: Dict[str, dict]) -> None:
+    """Atomically replace the manifest stored in ``destination``."""
+    path = os.path.join(destination, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump({"version": 1, "files": entries}, fh, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _manifest_entry(item: dict) -> dict:
+    return {field: item.get(field) for field in MANIFEST_FIELDS}
+
+
+def _is_unchanged(entry: dict | None, item: dict) -> bool:
+    """Return True if the local copy recorded in ``entry`` matches ``item``."""
+    if entry is None or entry != _manifest_entry(item):
+        return False
+    try:
+        local_size = os.path.getsize(item["path"])
+    except OSError:
+        return False
+    return item.get("size") is None or local_size == int(item["size"])
+
+
+def _fetch_item(service, item: dict, options: dict | None = None) -> None:
+    _download_file(
+        service,
+        item["id"],
+        item["path"],
+        item.get("size"),
+        item.get("md5Checksum"),
+        **(options or {}),
+    )
+
+
+def _download_worker(
+    item: dict, cache: StagingCache | None = None, options: dict | None = None
+) -> bool:
+    """Download one listed file; return True if it was served from ``cache``.
+
+    ``options`` are passed on to ``_download_file``.
+    """
+    md5_checksum = item.get("md5Checksum")
+    metrics.add_gauge("drive_downloads_in_progress", 1)
+    try:
+        if cache is None or not md5_checksum:
+            with _drive_service() as service:
+                _fetch_item(service, item, options)
+            return False
+
+        def download(tmp_path: str) -> None:
+            # Report progress for the destination, not the cache's temp file
+            staged_options = dict(options or {}, progress_path=item["path"])
+            with _drive_service() as service:
+                _fetch_item(service, dict(item, path=tmp_path), staged_options)
+
+        hit = cache.fetch(md5_checksum, item["path"], download)
+        metrics.inc("staging_cache_lookups_total", result="hit" if hit else "miss")
+        return hit
+    finally:
+        metrics.add_gauge("drive_downloads_in_progress", -1)
+
+
+def download_folder(
+    path: str,
+    destination: str,
+    max_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+    sync: bool = False,
+    delete_removed: bool = False,
+    cache: StagingCache | None = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    memory_budget: int | None = None,
+    progress: ProgressCallback | None = None,
+    fsync_bytes: int = 0,
+) -> Dict[str, int]:
+    """Download the entire Drive folder to the destination path.
+
+    The folder tree is listed first and the files are then fetched on a pool
+    of ``max_workers`` threads. Failed files do not abort the remaining
+    transfers; they are collected and reported in a single ``DownloadError``.
+
+    A manifest of the downloaded files is kept in ``destination``. With
+    ``sync`` enabled, files whose Drive id, checksum, size and modification
+    time match the manifest are skipped, and ``delete_removed`` removes local
+    files recorded in the manifest that no longer exist on Drive.
+
+    With a staging ``cache``, files are stored once per ``md5Checksum`` in
+    the cache and hardlinked into ``destination``; files already cached are
+    not fetched from Drive again.
+
+    Each worker buffers at most ``chunk_size`` bytes. With ``memory_budget``
+    the chunk size is lowered so all workers together stay within the
+    budget, letting more workers run without using more memory.
+    ``progress`` is called from the worker threads with a ``Progress``
+    after every chunk, and ``fsync_bytes`` batches fsyncs of written data.
+
+    Returns counts of ``downloaded``, ``cached``, ``skipped`` and ``deleted``
+    files.
+    """
+    with _drive_service() as service:
+        files = _with_folder(
+            service,
+            path,
+            lambda folder_id: _list_folder_files(service, folder_id, destination),
         )
-        for item in response.get("files", []):
-            target = os.path.join(dest_dir, item["name"])
-            if item["mimeType"] == FOLDER_MIME_TYPE:
-                _download_folder_by_id(service, item["id"], target)
+
+    previous = _load_manifest(destination) if sync else {}
+    manifest: Dict[str, dict] = {}
+    pending: List[dict] = []
+    for item in files:
+        key = _manifest_key(destination, item["path"])
+        if sync and _is_unchanged(previous.get(key), item):
+            manifest[key] = previous[key]
+        else:
+            pending.append(item)
+
+    deleted = 0
+    if sync and delete_removed:
+        remote_keys = {_manifest_key(destination, item["path"]) for item in files}
+        for key in previous:
+            if key in remote_keys:
+                continue
+            try:
+                os.remove(os.path.join(destination, *key.split("/")))
+                deleted += 1
+            except FileNotFoundError:
+                pass
+
+    if memory_budget is not None:
+        chunk_size = max(MIN_CHUNK_SIZE, min(chunk_size, memory_budget // max(1, max_workers)))
+    options = {"chunk_size": chunk_size, "progress": progress, "fsync_bytes": fsync_bytes}
+    failures: List[Tuple[str, str, Exception]] = []
+    cached = 0
+
+    def record(item: dict, err: Exception | None, hit: bool = False) -> None:
+        nonlocal cached
+        if err is None:
+            manifest[_manifest_key(destination, item["path"])] = _manifest_entry(item)
+            cached += hit
+        else:
+            failures.append((item["id"], item["path"], err))
+
+    if max_workers <= 1:
+        for item in pending:
+            try:
+                hit = _download_worker(item, cache, options)
+            except Exception as err:
+                record(item, err)
             else:
-                _download_file(service, item["id"], target)
-        page_token = response.get("nextPageToken")
-        if not page_token:
-            break
+                record(item, None, hit)
+    else:
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="drive-download"
+        ) as pool:
+            futures = {
+                pool.submit(_download_worker, item, cache, options): item for item in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    hit = future.result()
+                except Exception as err:
+                    record(futures[future], err)
+                else:
+                    record(futures[future], None, hit)
+
+    _write_manifest(destination, manifest)
+    if failures:
+        raise DownloadError(failures)
+    return {
+        "downloaded": len(pending) - cached,
+        "cached": cached,
+        "skipped": len(files) - len(pending),
+        "deleted": deleted,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Remote validation
+# ---------------------------------------------------------------------------
+
+def _read_media(file_id: str) -> bytes:
+    with _drive_service() as service:
+        return _execute(service.files().get_media(fileId=file_id))
+
+
+def validate_remote_project(
+    path: str, max_workers: int = DEFAULT_DOWNLOAD_WORKERS
+) -> List[str]:
+    """Validate a Drive project folder without downloading its videos.
+
+    The rules of ``validators.validate_project`` are applied to the tree
+    listing; only the ``metadata.json`` files are downloaded, on up to
+    ``max_workers`` threads. Errors have the same format, with Drive paths
+    such as ``projects/demo/video1`` in place of local ones.
+    """
+    with _drive_service() as service:
+        items = _with_folder(
+            service, path, lambda folder_id: walk_tree(service, folder_id, "id, name, mimeType")
+        )
+
+    base = PurePosixPath(_path_key(path))
+    listing: Dict[PurePosixPath, Tuple[List[str], List[str]]] = {base: ([], [])}
+    metadata_ids: Dict[PurePosixPath, str] = {}
+    for item in items:
+        item_path = base / item["path"]
+        dirs, files = listing[item_path.parent]
+        if item["mimeType"] == FOLDER_MIME_TYPE:
+            dirs.append(item["name"])
+            listing[item_path] = ([], [])
+        else:
+            files.append(item["name"])
+            if item["name"] == "metadata.json":
+                metadata_ids[item_path] = item["id"]
+
+    contents: Dict[PurePosixPath, str] = {}
+    if metadata_ids:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            paths = list(metadata_ids)
+            for meta_path, data in zip(paths, pool.map(_read_media, metadata_ids.values())):
+                contents[meta_path] = data.decode("utf-8", errors="replace")
 
+    def scan(dir_path: PurePosixPath) -> Tuple[List[str], List[str]]:
+        dirs, files = listing[dir_path]
+        return sorted(dirs), sorted(files)
 
-def download_folder(path: str, destination: str) -> None:
-    """Download the entire Drive folder to the destination path."""
-    service = _get_service()
-    folder_id = _resolve_path(service, path)
-    _download_folder_by_id(service, folder_id, destination)
+    return validators.validate_tree(base, scan, contents.__getitem__)
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+# Fields requested for every change in ``changes().list``
+CHANGE_FIELDS = (
+    "nextPageToken, newStartPageToken, changes(fileId, removed, "
+    "file(id, name, mimeType, parents, md5Checksum, size, modifiedTime, trashed))"
+)
+# Changes requested per ``changes().list`` page
+CHANGES_PAGE_SIZE = 1000
+
+
+def _execute(request):
+    return request.execute()
+
+
+class DriveMirror:
+    """Local SQLite mirror of the Drive tree below the projects root.
+
+    The mirror is filled from a full listing once (``reset``) and then kept
+    current from Drive's ``changes.list`` feed (``apply_changes``), so path
+    resolution and folder listings can be answered without API calls.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                parent_id TEXT NOT NULL,
+                mime_type TEXT NOT NULL,
+                md5_checksum TEXT,
+                size INTEGER,
+                modified_time TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_files_parent ON files(parent_id, name);
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        key = (self.db_path, os.getpid())
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.key != key:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.key = key
+        return conn
+
+    # -- state ---------------------------------------------------------------
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_state(conn: sqlite3.Connection, values: Dict[str, str]) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", values.items()
+        )
+
+    @property
+    def root_id(self) -> Optional[str]:
+        return self._get_state("root_id")
+
+    @property
+    def root_path(self) -> Optional[str]:
+        return self._get_state("root_path")
+
+    @property
+    def page_token(self) -> Optional[str]:
+        return self._get_state("page_token")
+
+    def is_warm(self, max_age: Optional[float] = None) -> bool:
+        """Return True if the mirror is initialised and synced within ``max_age``."""
+        if self.page_token is None:
+            return False
+        if max_age is None:
+            return True
+        synced_at = self._get_state("synced_at")
+        return synced_at is not None and time.time() - float(synced_at) <= max_age
+
+    # -- writes --------------------------------------------------------------
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, items: Iterable[dict], parent_id: str | None = None) -> None:
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO files
+                (id, name, parent_id, mime_type, md5_checksum, size, modified_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    item["id"],
+                    item["name"],
+                    parent_id or item["parents"][0],
+                    item["mimeType"],
+                    item.get("md5Checksum"),
+                    int(item["size"]) if item.get("size") is not None else None,
+                    item.get("modifiedTime"),
+                )
+                for item in items
+            ],
+        )
+
+    @staticmethod
+    def _delete_subtree(conn: sqlite3.Connection, file_id: str) -> None:
+        conn.execute(
+            """
+            WITH RECURSIVE subtree(id) AS (
+                SELECT ?
+                UNION ALL
+                SELECT files.id FROM files JOIN subtree ON files.parent_id = subtree.id
+            )
+            DELETE FROM files WHERE id IN (SELECT id FROM subtree)
+            """,
+            (file_id,),
+        )
+
+    def reset(self, root_id: str, root_path: str, items: Iterable[dict], page_token: str) -> None:
+        """Replace the mirror with a full listing of the tree below ``root_id``.
+
+        ``items`` are Drive file resources including ``parents``, and
+        ``page_token`` is a start page token obtained *before* listing, so no
+        change made during the listing is missed.
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM files")
+            self._upsert(conn, items)
+            self._set_state(
+                conn,
+                {
+                    "root_id": root_id,
+                    "root_path": _normalize(root_path),
+                    "page_token": page_token,
+                    "synced_at": str(time.time()),
+                },
+            )
+
+    def add_items(self, items: Iterable[dict]) -> None:
+        """Add listed items, e.g. the contents of a folder moved into the tree."""
+        conn = self._conn()
+        with conn:
+            self._upsert(conn, items)
+
+    def apply_changes(self, service, execute: Callable = _execute) -> List[str]:
+        """Apply every change from the feed since the stored page token.
+
+        Returns the IDs of folders that entered the tree from outside it;
+        their contents are not part of the feed and must be listed by the
+        caller and passed to ``add_items``. ``execute`` runs each API
+        request, e.g. through a rate limiter. If the root folder itself is
+        trashed or removed the mirror is emptied and its page token dropped,
+        so it is no longer warm and the next sync lists the tree again.
+        """
+        token = self.page_token
+        if token is None:
+            raise RuntimeError("Drive mirror has not been initialised")
+        root_id = self.root_id
+        conn = self._conn()
+        new_folders: List[str] = []
+        while True:
+            response = execute(
+                service.changes().list(
+                    pageToken=token,
+                    spaces="drive",
+                    fields=CHANGE_FIELDS,
+                    pageSize=CHANGES_PAGE_SIZE,
+                    includeRemoved=True,
+                )
+            )
+            changes = response.get("changes", [])
+            with conn:
+                if any(c["fileId"] == root_id and _is_removal(c) for c in changes):
+                    conn.execute("DELETE FROM files")
+                    conn.execute("DELETE FROM state WHERE key = 'page_token'")
+                    return []
+                new_folders.extend(self._apply_page(conn, root_id, changes))
+                token = response.get("nextPageToken") or response["newStartPageToken"]
+                self._set_state(conn, {"page_token": token, "synced_at": str(time.time())})
+            if "newStartPageToken" in response:
+                return new_folders
+
+    def _apply_page(self, conn: sqlite3.Connection, root_id: str, changes: List[dict]) -> List[str]:
+        new_folders: List[str] = []
+        pending: List[dict] = []
+        for change in changes:
+            if change["fileId"] == root_id:
+                # Renaming or sharing the root does not change the tree; its
+                # parent is outside the mirror, so it must not be deferred
+                continue
+            if _is_removal(change):
+                self._delete_subtree(conn, change["fileId"])
+            else:
+                pending.append(change["file"])
+        # A child can be reported before its new parent; retry until stable
+        while pending:
+            deferred: List[dict] = []
+            for item in pending:
+                parents = item.get("parents") or []
+                tracked = [p for p in parents if p == root_id or self._has(conn, p)]
+                if tracked:
+                    if item["mimeType"] == FOLDER_MIME_TYPE and not self._has(conn, item["id"]):
+                        new_folders.append(item["id"])
+                    self._upsert(conn, [item], tracked[0])
+                else:
+                    deferred.append(item)
+            if len(deferred) == len(pending):
+                # Outside the mirrored tree, or moved out of it
+                for item in deferred:
+                    self._delete_subtree(conn, item["id"])
+                break
+            pending = deferred
+        return new_folders
+
+    @staticmethod
+    def _has(conn: sqlite3.Connection, file_id: str) -> bool:
+        return conn.execute("SELECT 1 FROM files WHERE id = ?", (file_id,)).fetchone() is not None
+
+    # -- reads ---------------------------------------------------------------
+
+    def resolve(self, path: str) -> Optional[str]:
+        """Return the folder ID of ``path``, or None if it is not mirrored."""
+        root_path = self.root_path
+        if root_path is None:
+            return None
+        parts = _split(path)
+        root_parts = _split(root_path)
+        if parts[: len(root_parts)] != root_parts:
+            return None
+        folder_id = self.root_id
+        conn = self._conn()
+        for name in parts[len(root_parts):]:
+            row = conn.execute(
+                "SELECT id FROM files WHERE parent_id = ? AND name = ? AND mime_type = ?",
+                (folder_id, name, FOLDER_MIME_TYPE),
+            ).fetchone()
+            if row is None:
+                return None
+            folder_id = row[0]
+        return folder_id
+
+    def children(self, parent_id: str, folders_only: bool = False) -> List[dict]:
+        """Return the mirrored children of ``parent_id`` as Drive-like dicts."""
+        query = "SELECT * FROM files WHERE parent_id = ?"
+        params: List[str] = [parent_id]
+        if folders_only:
+            query += " AND mime_type = ?"
+            params.append(FOLDER_MIME_TYPE)
+        rows = self._conn().execute(query + " ORDER BY name", params).fetchall()
+        children = []
+        for row in rows:
+            item = {"id": row["id"], "name": row["name"], "mimeType": row["mime_type"]}
+            if row["md5_checksum"] is not None:
+                item["md5Checksum"] = row["md5_checksum"]
+            if row["size"] is not None:
+                item["size"] = str(row["size"])
+            if row["modified_time"] is not None:
+                item["modifiedTime"] = row["modified_time"]
+            children.append(item)
+        return children
+
+
+def _is_removal(change: dict) -> bool:
+    item = change.get("file")
+    return bool(change.get("removed") or item is None or item.get("trashed"))
+
+
+def _split(path: str) -> List[str]:
+    return [p for p in path.strip("/").split("/") if p]
+
+
+def _normalize(path: str) -> str:
+    return "/".join(_split(path))
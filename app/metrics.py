@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Upper bounds, in seconds, of the buckets of every timing histogram
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Seconds between snapshots written by a worker process
+SNAPSHOT_INTERVAL = 5.0
+# Snapshots of processes that stopped writing this long ago are ignored
+SNAPSHOT_MAX_AGE = 600.0
+
+# Model and validator helpers timed by ``setup``
+MODEL_FUNCTIONS = (
+    "save_project",
+    "get_project",
+    "add_schedule",
+    "add_schedules",
+    "get_schedules",
+    "get_schedules_for_projects",
+    "claim_due_schedules",
+    "mark_schedules_published",
+    "release_schedules",
+    "record_assets",
+    "find_assets",
+    "record_upload",
+    "find_upload",
+)
+VALIDATOR_FUNCTIONS = ("validate_project", "validate_tree", "validate_folder", "probe_mp4")
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_enabled = False
+_snapshot_dir: Optional[str] = None
+_last_snapshot = 0.0
+_lock = threading.Lock()
+_counters: Dict[_Key, float] = {}
+_gauges: Dict[_Key, float] = {}
+# Per-bucket (non-cumulative) counts followed by the sum of observed values
+_histograms: Dict[_Key, List[float]] = {}
+_collectors: List[Callable[[], None]] = []
+_null = nullcontext()
+
+
+def configure(enabled: bool = True, snapshot_dir: Optional[str] = None) -> None:
+    """Turn recording on or off.
+
+    With ``snapshot_dir`` every process periodically writes its metrics to
+    that directory and ``render`` merges them, so metrics recorded in
+    Celery workers are exposed by the web process.
+    """
+    global _enabled, _snapshot_dir
+    _enabled = enabled
+    _snapshot_dir = snapshot_dir or None
+    if _snapshot_dir:
+        os.makedirs(_snapshot_dir, exist_ok=True)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """Forget everything recorded by this process."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def _key(name: str, labels: Dict[str, object]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """Add ``value`` to a counter."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Set a gauge to ``value``."""
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def add_gauge(name: str, delta: float, **labels) -> None:
+    """Move a gauge by ``delta``, e.g. to count work in progress."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record ``value`` in a histogram."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    index = bisect_left(DEFAULT_BUCKETS, value)
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0.0] * (len(DEFAULT_BUCKETS) + 2)
+        values[index] += 1
+        values[-1] += value
+
+
+@contextmanager
+def _timer(name: str, labels: Dict[str, object]) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timer(name: str, **labels):
+    """Context manager recording the duration of its block in a histogram."""
+    if not _enabled:
+        return _null
+    return _timer(name, labels)
+
+
+def timed(name: str, **labels):
+    """Decorator recording the duration of every call in a histogram."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _timer(name, labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument(module, names: Iterable[str], metric: str) -> None:
+    """Time the named functions of ``module`` under ``metric{op=<name>}``.
+
+    Functions are replaced on the module, so callers that look them up as
+    ``module.func`` are timed. Instrumenting twice has no further effect.
+    """
+    for name in names:
+        func = getattr(module, name, None)
+        if func is None or getattr(func, "_metrics_timed", False):
+            continue
+        wrapper = timed(metric, op=name)(func)
+        wrapper._metrics_timed = True
+        setattr(module, name, wrapper)
+
+
+def register_collector(func: Callable[[], None]) -> None:
+    """Call ``func`` before every ``render`` to refresh gauges."""
+    _collectors.append(func)
+
+
+def setup(snapshot_dir: Optional[str] = None) -> None:
+    """Enable metrics and time the model and validator helpers."""
+    from . import models, validators
+
+    configure(True, snapshot_dir)
+    instrument(models, MODEL_FUNCTIONS, "models_call_seconds")
+    instrument(validators, VALIDATOR_FUNCTIONS, "validator_call_seconds")
+
+
+# ---------------------------------------------------------------------------
+# Celery
+# ---------------------------------------------------------------------------
+
+_task_started: Dict[str, float] = {}
+
+
+def _before_publish(headers=None, **kwargs) -> None:
+    if headers is not None:
+        headers["published_at"] = time.time()
+
+
+def _task_prerun(task_id=None, task=None, **kwargs) -> None:
+    now = time.time()
+    _task_started[task_id] = time.perf_counter()
+    request = task.request
+    published_at = getattr(request, "published_at", None)
+    if published_at is None:
+        published_at = (getattr(request, "headers", None) or {}).get("published_at")
+    if published_at is None:
+        return
+    ready_at = float(published_at)
+    if request.eta:
+        # ETA tasks are not late before their ETA
+        eta = request.eta if isinstance(request.eta, datetime) else datetime.fromisoformat(request.eta)
+        ready_at = max(ready_at, eta.timestamp())
+    observe("celery_queue_latency_seconds", max(0.0, now - ready_at), task=task.name)
+
+
+def _task_postrun(task_id=None, task=None, state=None, **kwargs) -> None:
+    start = _task_started.pop(task_id, None)
+    if start is not None:
+        observe("celery_task_seconds", time.perf_counter() - start, task=task.name, state=state)
+    write_snapshot()
+
+
+def instrument_celery() -> None:
+    """Record task durations and queue-to-start latency from Celery signals.
+
+    Publishers stamp each message with its publish time; workers compare it
+    with the moment the task starts (or its ETA, if later).
+    """
+    from celery import signals
+
+    signals.before_task_publish.connect(_before_publish, weak=False)
+    signals.task_prerun.connect(_task_prerun, weak=False)
+    signals.task_postrun.connect(_task_postrun, weak=False)
+
+
+# ---------------------------------------------------------------------------
+# Exposition
+# ---------------------------------------------------------------------------
+
+def _snapshot() -> dict:
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "counters": [[name, labels, value] for (name, labels), value in _counters.items()],
+            "gauges": [[name, labels, value] for (name, labels), value in _gauges.items()],
+            "histograms": [[name, labels, values] for (name, labels), values in _histograms.items()],
+        }
+
+
+def write_snapshot(force: bool = False) -> None:
+    """Write this process's metrics to the snapshot directory, if any.
+
+    Writes happen at most every ``SNAPSHOT_INTERVAL`` seconds unless forced.
+    """
+    global _last_snapshot
+    if not _enabled or _snapshot_dir is None:
+        return
+    now = time.time()
+    if not force and now - _last_snapshot < SNAPSHOT_INTERVAL:
+        return
+    _last_snapshot = now
+    path = os.path.join(_snapshot_dir, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(_snapshot(), fh)
+    os.replace(path + ".tmp", path)
+
+
+def _load_snapshots() -> List[dict]:
+    snapshots = [_snapshot()]
+    if _snapshot_dir is None:
+        return snapshots
+    own = f"{os.getpid()}.json"
+    now = time.time()
+    with os.scandir(_snapshot_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json") or entry.name == own:
+                continue
+            try:
+                if now - entry.stat().st_mtime > SNAPSHOT_MAX_AGE:
+                    continue
+                with open(entry.path, encoding="utf-8") as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+    return snapshots
+
+
+def _labels(labels: Iterable, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = [tuple(pair) for pair in labels] + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _value(value: float) -> str:
+    """Format a sample value without losing precision."""
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text exposition format.
+
+    Counters and histograms of all processes are summed; gauges are
+    labelled with the ``pid`` of the process that set them when more than
+    one process reports.
+    """
+    for collector in _collectors:
+        collector()
+    snapshots = _load_snapshots()
+    counters: Dict[tuple, float] = {}
+    histograms: Dict[tuple, List[float]] = {}
+    gauges: Dict[tuple, float] = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0.0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+        for name, labels, value in snapshot["gauges"]:
+            labels = tuple(map(tuple, labels))
+            if len(snapshots) > 1:
+                labels += (("pid", str(snapshot["pid"])),)
+            gauges[(name, labels)] = value
+
+    lines: List[str] = []
+    typed = set()
+
+    def declare(name: str, kind: str) -> None:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        declare(name, "counter")
+        lines.append(f"{name}{_labels(labels)} {_value(value)}")
+    for (name, labels), value in sorted(gauges.items()):
+        declare(name, "gauge")
+        lines.append(f"{name}{_labels(labels)} {_value(value)}")
+    for (name, labels), values in sorted(histograms.items()):
+        declare(name, "histogram")
+        cumulative = 0.0
+        for bound, count in zip(DEFAULT_BUCKETS, values):
+            cumulative += count
+            bucket = _labels(labels, (("le", f"{bound:g}"),))
+            lines.append(f"{name}_bucket{bucket} {_value(cumulative)}")
+        cumulative += values[len(DEFAULT_BUCKETS)]
+        lines.append(f"{name}_bucket{_labels(labels, (('le', '+Inf'),))} {_value(cumulative)}")
+        lines.append(f"{name}_sum{_labels(labels)} {_value(values[-1])}")
+        lines.append(f"{name}_count{_labels(labels)} {_value(cumulative)}")
+    return "\n".join(lines) + "\n"
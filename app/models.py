@@ -3,48 +3,209 @@ from __future__ import annotations
 import json
 import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 # Path to the SQLite database storing project information and schedules
 DB_PATH = os.path.join(os.path.dirname(__file__), "app.db")
 
+# Milliseconds a connection waits on a locked database before failing
+BUSY_TIMEOUT_MS = 5000
+# Prepared statements kept per connection by the sqlite3 module
+STATEMENT_CACHE_SIZE = 128
+
+# ``task_id`` of schedules published before task IDs were recorded
+LEGACY_TASK_ID = "legacy"
+
+# Schema migrations in the order they are applied. Each entry is a tuple of
+# statements; never edit an entry once released, append a new one instead.
+_MIGRATIONS: List[Tuple[str, ...]] = [
+    (
+        """
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            folder_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            metadata TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            scheduled_at TEXT NOT NULL,
+            metadata TEXT,
+            FOREIGN KEY(project_id) REFERENCES projects(id)
+        )
+        """,
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS idx_schedules_project_time "
+        "ON schedules(project_id, scheduled_at)",
+        "CREATE INDEX IF NOT EXISTS idx_schedules_time ON schedules(scheduled_at)",
+    ),
+    (
+        "ALTER TABLE schedules ADD COLUMN dispatched_at TEXT",
+        # Before the dispatcher, ``enqueue_uploads`` published every schedule
+        # of a project at once as an ETA task, future slots included, and
+        # workers still hold those messages. Mark all existing schedules
+        # dispatched so none is published twice; ``requeue_schedules``
+        # publishes a slot again if its ETA message was lost.
+        "UPDATE schedules SET dispatched_at = scheduled_at",
+        "CREATE INDEX IF NOT EXISTS idx_schedules_pending "
+        "ON schedules(scheduled_at) WHERE dispatched_at IS NULL",
+    ),
+    (
+        "ALTER TABLE schedules ADD COLUMN task_id TEXT",
+        # Dispatched rows were published by the old code; give them a task
+        # ID so ``reclaim_stale_schedules`` does not publish them again
+        f"UPDATE schedules SET task_id = '{LEGACY_TASK_ID}' WHERE dispatched_at IS NOT NULL",
+    ),
+    (
+        """
+        CREATE TABLE IF NOT EXISTS assets (
+            drive_file_id TEXT PRIMARY KEY,
+            md5_checksum TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            project_folder_id TEXT,
+            seen_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_assets_content ON assets(md5_checksum, size)",
+        """
+        CREATE TABLE IF NOT EXISTS asset_uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            md5_checksum TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            schedule_id INTEGER,
+            result TEXT,
+            uploaded_at TEXT NOT NULL,
+            FOREIGN KEY(schedule_id) REFERENCES schedules(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_asset_uploads_content "
+        "ON asset_uploads(md5_checksum, size, platform)",
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS idx_schedules_unpublished "
+        "ON schedules(dispatched_at) WHERE task_id IS NULL",
+    ),
+    ("CREATE INDEX IF NOT EXISTS idx_projects_folder ON projects(folder_id)",),
+]
+SCHEMA_VERSION = len(_MIGRATIONS)
+# Upper bound on bound parameters used in a single ``IN (...)`` clause
+MAX_IN_PARAMS = 500
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+# ``(DB_PATH, pid)`` pairs whose schema has been set up by this process
+_schema_ready: Set[Tuple[str, int]] = set()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
 
 def _get_conn() -> sqlite3.Connection:
-    """Return a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
+    """Return the calling thread's connection to the SQLite database.
+
+    Connections are opened once per thread and reused. A connection
+    inherited from a parent process (e.g. a forked Celery worker) or opened
+    for a different ``DB_PATH`` is replaced.
+    """
+    key = (DB_PATH, os.getpid())
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key == key:
+        return conn
+    init_db()
+    conn = _connect()
     conn.row_factory = sqlite3.Row
+    _local.conn = conn
+    _local.key = key
     return conn
 
 
-def init_db() -> None:
-    """Create required tables if they do not exist."""
+def close_db() -> None:
+    """Close the calling thread's database connection, if one is open."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key[1] == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+@contextmanager
+def _transaction(immediate: bool = False) -> Iterator[sqlite3.Connection]:
+    """Run a block in a transaction that is committed or rolled back on exit.
+
+    With ``immediate`` the write lock is taken up front, so reads made in
+    the block cannot be invalidated by another writer before it commits.
+    """
     conn = _get_conn()
+    with conn:
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Apply the migrations the database has not seen yet.
+
+    ``PRAGMA user_version`` records how many entries of ``_MIGRATIONS`` have
+    run. The check and the migrations share one ``BEGIN IMMEDIATE``
+    transaction so concurrent processes apply each migration only once.
+    """
+    conn.isolation_level = None
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS projects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                folder_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                metadata TEXT
-            )
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS schedules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER NOT NULL,
-                scheduled_at TEXT NOT NULL,
-                metadata TEXT,
-                FOREIGN KEY(project_id) REFERENCES projects(id)
-            )
-            """
-        )
-        conn.commit()
-    finally:
-        conn.close()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(_MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def init_db() -> None:
+    """Create required tables if they do not exist and apply migrations.
+
+    The schema is set up once per process and database path; later calls
+    return immediately. This also switches the database to WAL journaling
+    so readers are not blocked by writers in other processes.
+    """
+    key = (DB_PATH, os.getpid())
+    if key in _schema_ready:
+        return
+    with _schema_lock:
+        if key in _schema_ready:
+            return
+        conn = _connect()
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            _migrate(conn)
+        finally:
+            conn.close()
+        _schema_ready.add(key)
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    data = dict(row)
+    if data.get("metadata"):
+        data["metadata"] = json.loads(data["metadata"])
+    return data
 
 
 # ---------------------------------------------------------------------------
@@ -53,35 +214,23 @@ def init_db() -> None:
 
 def save_project(folder_id: str, name: str, metadata: Optional[Dict[str, Any]] = None) -> int:
     """Insert a new project record and return its ID."""
-    init_db()
-    conn = _get_conn()
-    try:
-        meta_json = json.dumps(metadata) if metadata is not None else None
+    meta_json = json.dumps(metadata) if metadata is not None else None
+    with _transaction() as conn:
         cur = conn.execute(
             "INSERT INTO projects (folder_id, name, metadata) VALUES (?, ?, ?)",
             (folder_id, name, meta_json),
         )
-        conn.commit()
-        return cur.lastrowid
-    finally:
-        conn.close()
+    return cur.lastrowid
 
 
 def get_project(project_id: int) -> Optional[Dict[str, Any]]:
     """Return a project row as a dictionary or ``None`` if not found."""
-    init_db()
-    conn = _get_conn()
-    try:
-        cur = conn.execute("SELECT * FROM projects WHERE id = ?", (project_id,))
-        row = cur.fetchone()
-    finally:
-        conn.close()
+    row = _get_conn().execute(
+        "SELECT * FROM projects WHERE id = ?", (project_id,)
+    ).fetchone()
     if row is None:
         return None
-    data = dict(row)
-    if data.get("metadata"):
-        data["metadata"] = json.loads(data["metadata"])
-    return data
+    return _row_to_dict(row)
 
 
 # ---------------------------------------------------------------------------
@@ -94,37 +243,262 @@ def add_schedule(
     metadata: Optional[Dict[str, Any]] = None,
 ) -> int:
     """Persist a scheduled upload for a project."""
-    init_db()
-    conn = _get_conn()
-    try:
-        meta_json = json.dumps(metadata) if metadata is not None else None
+    meta_json = json.dumps(metadata) if metadata is not None else None
+    with _transaction() as conn:
         cur = conn.execute(
             "INSERT INTO schedules (project_id, scheduled_at, metadata) VALUES (?, ?, ?)",
             (project_id, scheduled_at.isoformat(), meta_json),
         )
-        conn.commit()
-        return cur.lastrowid
-    finally:
-        conn.close()
+    return cur.lastrowid
+
+
+def add_schedules(
+    project_id: int,
+    schedules: Iterable[Union[datetime, Tuple[datetime, Optional[Dict[str, Any]]]]],
+) -> int:
+    """Persist many scheduled uploads for a project in one transaction.
+
+    ``schedules`` yields either datetimes or ``(datetime, metadata)`` pairs.
+    Returns the number of rows inserted.
+    """
+    rows = []
+    for entry in schedules:
+        scheduled_at, metadata = entry if isinstance(entry, tuple) else (entry, None)
+        meta_json = json.dumps(metadata) if metadata is not None else None
+        rows.append((project_id, scheduled_at.isoformat(), meta_json))
+    with _transaction() as conn:
+        conn.executemany(
+            "INSERT INTO schedules (project_id, scheduled_at, metadata) VALUES (?, ?, ?)",
+            rows,
+        )
+    return len(rows)
 
 
 def get_schedules(project_id: int) -> List[Dict[str, Any]]:
     """Return all scheduled uploads for the given project ordered by time."""
-    init_db()
+    rows = _get_conn().execute(
+        "SELECT * FROM schedules WHERE project_id = ? ORDER BY scheduled_at",
+        (project_id,),
+    ).fetchall()
+    return [_row_to_dict(r) for r in rows]
+
+
+def get_schedules_for_projects(project_ids: Iterable[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Return scheduled uploads for many projects, keyed by project ID.
+
+    Each project's schedules are ordered by time; projects without any
+    schedules map to an empty list.
+    """
+    ids = list(dict.fromkeys(project_ids))
+    result: Dict[int, List[Dict[str, Any]]] = {pid: [] for pid in ids}
     conn = _get_conn()
-    try:
+    for start in range(0, len(ids), MAX_IN_PARAMS):
+        chunk = ids[start:start + MAX_IN_PARAMS]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT * FROM schedules WHERE project_id IN ({placeholders}) "
+            "ORDER BY project_id, scheduled_at",
+            chunk,
+        ).fetchall()
+        for r in rows:
+            result[r["project_id"]].append(_row_to_dict(r))
+    return result
+
+
+def claim_due_schedules(
+    until: datetime,
+    project_id: Optional[int] = None,
+    limit: int = 500,
+) -> List[Dict[str, Any]]:
+    """Claim up to ``limit`` undispatched schedules due at or before ``until``.
+
+    The claimed rows are marked dispatched in the same ``BEGIN IMMEDIATE``
+    transaction that selects them, so concurrent dispatchers never claim a
+    row twice. Rows are returned ordered by time, optionally restricted to
+    one project.
+    """
+    query = "SELECT * FROM schedules WHERE dispatched_at IS NULL AND scheduled_at <= ?"
+    params: List[Any] = [until.isoformat()]
+    if project_id is not None:
+        query += " AND project_id = ?"
+        params.append(project_id)
+    query += " ORDER BY scheduled_at LIMIT ?"
+    params.append(limit)
+    dispatched_at = datetime.now().isoformat()
+    with _transaction(immediate=True) as conn:
+        rows = conn.execute(query, params).fetchall()
+        conn.executemany(
+            "UPDATE schedules SET dispatched_at = ? WHERE id = ?",
+            [(dispatched_at, r["id"]) for r in rows],
+        )
+    claimed = [_row_to_dict(r) for r in rows]
+    for item in claimed:
+        item["dispatched_at"] = dispatched_at
+    return claimed
+
+
+def reclaim_stale_schedules(
+    stale_before: datetime,
+    project_id: Optional[int] = None,
+    limit: int = 500,
+) -> List[Dict[str, Any]]:
+    """Claim again schedules dispatched before ``stale_before`` but never published.
+
+    A dispatcher that dies between claiming rows and recording their task
+    IDs leaves them marked dispatched without a ``task_id``. Such rows are
+    re-stamped with the current time and returned, like
+    ``claim_due_schedules``, so they can be published again. The crash may
+    have happened after a task was sent, so delivery is at-least-once.
+    """
+    query = (
+        "SELECT * FROM schedules "
+        "WHERE task_id IS NULL AND dispatched_at IS NOT NULL AND dispatched_at < ?"
+    )
+    params: List[Any] = [stale_before.isoformat()]
+    if project_id is not None:
+        query += " AND project_id = ?"
+        params.append(project_id)
+    query += " ORDER BY scheduled_at LIMIT ?"
+    params.append(limit)
+    dispatched_at = datetime.now().isoformat()
+    with _transaction(immediate=True) as conn:
+        rows = conn.execute(query, params).fetchall()
+        conn.executemany(
+            "UPDATE schedules SET dispatched_at = ? WHERE id = ?",
+            [(dispatched_at, r["id"]) for r in rows],
+        )
+    claimed = [_row_to_dict(r) for r in rows]
+    for item in claimed:
+        item["dispatched_at"] = dispatched_at
+    return claimed
+
+
+def mark_schedules_published(task_ids: Dict[int, str]) -> None:
+    """Record the Celery task ID published for each schedule ID."""
+    with _transaction() as conn:
+        conn.executemany(
+            "UPDATE schedules SET task_id = ? WHERE id = ?",
+            [(task_id, schedule_id) for schedule_id, task_id in task_ids.items()],
+        )
+
+
+def release_schedules(schedule_ids: Iterable[int]) -> None:
+    """Return claimed but unpublished schedules to the dispatch queue."""
+    with _transaction() as conn:
+        conn.executemany(
+            "UPDATE schedules SET dispatched_at = NULL WHERE id = ? AND task_id IS NULL",
+            [(schedule_id,) for schedule_id in schedule_ids],
+        )
+
+
+def requeue_schedules(schedule_ids: Iterable[int]) -> None:
+    """Put schedules back in the dispatch queue even if they were published.
+
+    Use this to publish a slot again whose task was lost, e.g. a schedule
+    from before the dispatcher existed whose ETA message a worker dropped.
+    """
+    with _transaction() as conn:
+        conn.executemany(
+            "UPDATE schedules SET dispatched_at = NULL, task_id = NULL WHERE id = ?",
+            [(schedule_id,) for schedule_id in schedule_ids],
+        )
+
+
+# ---------------------------------------------------------------------------
+# Asset helpers
+# ---------------------------------------------------------------------------
+
+def record_assets(items: Iterable[Dict[str, Any]], project_folder_id: Optional[str] = None) -> int:
+    """Index Drive files by content so duplicates can be found across projects.
+
+    ``items`` are Drive file resources; those without ``md5Checksum`` and
+    ``size`` (folders, Google Docs) are ignored. ``project_folder_id`` is the
+    Drive folder the files were listed under. Returns the number indexed.
+    """
+    seen_at = datetime.now().isoformat()
+    rows = [
+        (
+            item["id"],
+            item["md5Checksum"],
+            int(item["size"]),
+            item.get("name", ""),
+            project_folder_id,
+            seen_at,
+        )
+        for item in items
+        if item.get("md5Checksum") and item.get("size") is not None
+    ]
+    if rows:
+        with _transaction() as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO assets
+                    (drive_file_id, md5_checksum, size, name, project_folder_id, seen_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+    return len(rows)
+
+
+def find_assets(md5_checksum: str, size: int) -> List[Dict[str, Any]]:
+    """Return every indexed Drive file with the given content.
+
+    Each row includes ``project_id`` and ``project_name`` when the folder it
+    was listed under belongs to a saved project.
+    """
+    rows = _get_conn().execute(
+        """
+        SELECT assets.*, projects.id AS project_id, projects.name AS project_name
+        FROM assets
+        LEFT JOIN projects ON projects.folder_id = assets.project_folder_id
+        WHERE assets.md5_checksum = ? AND assets.size = ?
+        """,
+        (md5_checksum, size),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def record_upload(
+    md5_checksum: str,
+    size: int,
+    platform: str,
+    result: Optional[Dict[str, Any]] = None,
+    schedule_id: Optional[int] = None,
+) -> int:
+    """Remember that content was uploaded to ``platform`` and with what result."""
+    with _transaction() as conn:
         cur = conn.execute(
-            "SELECT * FROM schedules WHERE project_id = ? ORDER BY scheduled_at",
-            (project_id,),
+            """
+            INSERT INTO asset_uploads
+                (md5_checksum, size, platform, schedule_id, result, uploaded_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                md5_checksum,
+                int(size),
+                platform,
+                schedule_id,
+                json.dumps(result) if result is not None else None,
+                datetime.now().isoformat(),
+            ),
         )
-        rows = cur.fetchall()
-    finally:
-        conn.close()
+    return cur.lastrowid
+
 
-    schedules: List[Dict[str, Any]] = []
-    for r in rows:
-        item = dict(r)
-        if item.get("metadata"):
-            item["metadata"] = json.loads(item["metadata"])
-        schedules.append(item)
-    return schedules
+def find_upload(md5_checksum: str, size: int, platform: str) -> Optional[Dict[str, Any]]:
+    """Return the latest upload of identical content to ``platform``, if any."""
+    row = _get_conn().execute(
+        """
+        SELECT * FROM asset_uploads
+        WHERE md5_checksum = ? AND size = ? AND platform = ?
+        ORDER BY id DESC LIMIT 1
+        """,
+        (md5_checksum, int(size), platform),
+    ).fetchone()
+    if row is None:
+        return None
+    data = dict(row)
+    if data.get("result"):
+        data["result"] = json.loads(data["result"])
+    return data
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Stacks reported for each slow request
+TOP_STACKS = 5
+# Innermost frames kept per sampled stack
+STACK_DEPTH = 12
+
+
+def _stack(frame) -> str:
+    parts: List[str] = []
+    while frame is not None and len(parts) < STACK_DEPTH:
+        code = frame.f_code
+        parts.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class SlowRequestProfiler:
+    """Sample the stacks of in-flight requests and log those of slow ones.
+
+    One daemon thread wakes every ``interval`` seconds and records the
+    current stack of each thread serving a request. When a request takes
+    longer than ``threshold`` seconds, its most frequent stacks are logged;
+    faster requests just drop their samples.
+    """
+
+    def __init__(self, threshold: float, interval: float = 0.01):
+        self.threshold = threshold
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active: Dict[int, Tuple[float, Counter]] = {}
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, (_, samples) in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_stack(frame)] += 1
+
+    def start(self) -> None:
+        with self._lock:
+            self._active[threading.get_ident()] = (time.perf_counter(), Counter())
+
+    def stop(self, name: str) -> None:
+        with self._lock:
+            entry = self._active.pop(threading.get_ident(), None)
+        if entry is None:
+            return
+        started, samples = entry
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold:
+            return
+        metrics.inc("http_slow_requests_total", endpoint=name)
+        count = sum(samples.values())
+        report = "\n".join(
+            f"  {n / count:6.1%} {stack}" for stack, n in samples.most_common(TOP_STACKS)
+        )
+        logger.warning(
+            "Slow request %s took %.3fs (%d samples):\n%s", name, elapsed, count, report
+        )
+
+    def init_app(self, app) -> None:
+        """Profile every request handled by ``app``."""
+        from flask import request
+
+        app.before_request(self.start)
+
+        @app.teardown_request
+        def _stop(exc=None) -> None:
+            self.stop(request.endpoint or request.path)
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "ratelimit.db")
+
+# Requests per second allowed at first, and the bounds the rate adapts within
+INITIAL_RATE = 10.0
+MIN_RATE = 0.5
+MAX_RATE = 200.0
+# Tokens that may accumulate while the bucket is idle
+BURST = 20.0
+# Requests per second gained for every second's worth of successful calls
+RATE_INCREASE = 1.0
+# Factor applied to the rate when Drive throttles us; applied at most once
+# per DECREASE_INTERVAL seconds so a burst of rejections counts only once
+RATE_DECREASE = 0.5
+DECREASE_INTERVAL = 1.0
+# Base and cap, in seconds, of the backoff after consecutive throttling
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 64.0
+# Attempts made for a single call that keeps being throttled
+MAX_ATTEMPTS = 6
+
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+def is_rate_limited(err: Exception | None) -> bool:
+    """Return True if ``err`` is a Drive 429 or rate-limit 403 response."""
+    status = getattr(getattr(err, "resp", None), "status", None)
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    try:
+        error = json.loads(getattr(err, "content", b"") or b"{}").get("error")
+    except (ValueError, AttributeError):
+        return False
+    if not isinstance(error, dict):
+        return False
+    reasons = {detail.get("reason") for detail in error.get("errors", [])}
+    return bool(reasons & RATE_LIMIT_REASONS)
+
+
+def _retry_after(err: Exception) -> float | None:
+    """Return the delay requested by a ``Retry-After`` header, if any."""
+    resp = getattr(err, "resp", None)
+    value = resp.get("retry-after") if hasattr(resp, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    """Token bucket shared by every process using the same database file.
+
+    Each call takes a token; tokens refill at ``rate`` per second up to
+    ``burst``. The rate adapts AIMD-style: successful calls raise it
+    additively and throttling responses halve it, so the processes sharing
+    the bucket converge on the throughput the quota allows. Throttling also
+    blocks the whole bucket for a jittered, exponentially growing backoff,
+    which keeps retries from arriving all at once.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        name: str = "drive",
+        initial_rate: float = INITIAL_RATE,
+        min_rate: float = MIN_RATE,
+        max_rate: float = MAX_RATE,
+        burst: float = BURST,
+    ):
+        self.db_path = db_path
+        self.name = name
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Successes not yet written to the shared state
+        self._successes = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        key = (self.db_path, os.getpid())
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.key != key:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL")
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS buckets (
+                        name TEXT PRIMARY KEY,
+                        tokens REAL NOT NULL,
+                        rate REAL NOT NULL,
+                        updated REAL NOT NULL,
+                        blocked_until REAL NOT NULL DEFAULT 0,
+                        strikes INTEGER NOT NULL DEFAULT 0,
+                        decreased_at REAL NOT NULL DEFAULT 0
+                    )
+                    """
+                )
+                conn.execute(
+                    "INSERT OR IGNORE INTO buckets (name, tokens, rate, updated) VALUES (?, ?, ?, ?)",
+                    (self.name, self.burst, self.initial_rate, time.time()),
+                )
+            self._local.conn = conn
+            self._local.key = key
+        return conn
+
+    def _take(self, cost: float) -> float:
+        """Take ``cost`` tokens if available; otherwise return seconds to wait."""
+        with self._lock:
+            successes, self._successes = self._successes, 0
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            tokens, rate, updated, blocked_until, strikes = conn.execute(
+                "SELECT tokens, rate, updated, blocked_until, strikes FROM buckets WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+            now = time.time()
+            if successes:
+                rate = min(self.max_rate, rate + RATE_INCREASE * successes / rate)
+                strikes = 0
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * rate)
+            # Calls costing more than a full bucket run on credit
+            needed = min(cost, self.burst)
+            if now < blocked_until:
+                wait = blocked_until - now
+            elif tokens >= needed:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (needed - tokens) / rate
+            conn.execute(
+                "UPDATE buckets SET tokens = ?, rate = ?, updated = ?, strikes = ? WHERE name = ?",
+                (tokens, rate, max(updated, now), strikes, self.name),
+            )
+        return wait
+
+    def acquire(self, cost: float = 1.0) -> None:
+        """Block until ``cost`` tokens could be taken from the bucket."""
+        while True:
+            wait = self._take(cost)
+            if wait <= 0:
+                return
+            # Jitter so waiting workers do not all retry at the same moment
+            time.sleep(wait * random.uniform(1.0, 1.25))
+
+    def succeeded(self, count: int = 1) -> None:
+        """Record successful calls; applied to the rate on the next acquire."""
+        with self._lock:
+            self._successes += count
+
+    def throttled(self, retry_after: float | None = None) -> None:
+        """Back off after Drive rejected a call for exceeding the quota."""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rate, blocked_until, strikes, decreased_at = conn.execute(
+                "SELECT rate, blocked_until, strikes, decreased_at FROM buckets WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+            now = time.time()
+            if now - decreased_at >= DECREASE_INTERVAL:
+                rate = max(self.min_rate, rate * RATE_DECREASE)
+                strikes += 1
+                decreased_at = now
+            if retry_after is None:
+                backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(strikes - 1, 0))
+                retry_after = backoff * random.uniform(0.5, 1.0)
+            blocked_until = max(blocked_until, now + retry_after)
+            # Drain the bucket so calls resume at the reduced rate
+            conn.execute(
+                """
+                UPDATE buckets SET tokens = 0, rate = ?, updated = ?, blocked_until = ?,
+                    strikes = ?, decreased_at = ?
+                WHERE name = ?
+                """,
+                (rate, blocked_until, blocked_until, strikes, decreased_at, self.name),
+            )
+
+    def call(self, func: Callable[[], T], cost: float = 1.0) -> T:
+        """Run ``func`` under the limiter, retrying while it is throttled."""
+        attempts = 0
+        while True:
+            self.acquire(cost)
+            try:
+                result = func()
+            except Exception as err:
+                attempts += 1
+                if not is_rate_limited(err) or attempts >= MAX_ATTEMPTS:
+                    raise
+                self.throttled(_retry_after(err))
+                continue
+            self.succeeded()
+            return result
+
+    def stats(self) -> Dict[str, float]:
+        """Return the current shared rate, tokens and remaining backoff."""
+        tokens, rate, blocked_until, strikes = self._conn().execute(
+            "SELECT tokens, rate, blocked_until, strikes FROM buckets WHERE name = ?",
+            (self.name,),
+        ).fetchone()
+        return {
+            "rate": rate,
+            "tokens": tokens,
+            "blocked_for": max(0.0, blocked_until - time.time()),
+            "strikes": strikes,
+        }
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator
+
+
+class StagingCache:
+    """Content-addressed store for downloaded Drive files.
+
+    Files are stored once per Drive ``md5Checksum`` under ``root/objects``
+    and hardlinked into per-project trees. The total size of stored objects
+    is kept under ``budget_bytes`` by evicting the least recently used
+    objects that are not pinned. Pins are reference counts kept in the
+    index database per owning process, so they are honoured by every
+    process sharing ``root``; pins left behind by processes that died are
+    discarded.
+    """
+
+    def __init__(self, root: str, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db_path = os.path.join(root, "index.db")
+        self._lock = threading.Lock()
+        # Striped locks so one process never downloads the same object twice
+        self._fetch_locks = [threading.Lock() for _ in range(64)]
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "incoming"), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS objects (
+                    md5 TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pins (
+                    md5 TEXT NOT NULL,
+                    pid INTEGER NOT NULL,
+                    refs INTEGER NOT NULL,
+                    PRIMARY KEY (md5, pid)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_objects_lru ON objects(last_used)")
+            conn.commit()
+            self._release_dead_pins(conn)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._db_path, timeout=30)
+
+    def object_path(self, md5: str) -> str:
+        """Return where the object with checksum ``md5`` is stored."""
+        return os.path.join(self.root, "objects", md5[:2], md5)
+
+    def _lookup(self, conn: sqlite3.Connection, md5: str) -> bool:
+        row = conn.execute("SELECT 1 FROM objects WHERE md5 = ?", (md5,)).fetchone()
+        if row is None or not os.path.exists(self.object_path(md5)):
+            return False
+        conn.execute("UPDATE objects SET last_used = ? WHERE md5 = ?", (time.time(), md5))
+        return True
+
+    def _add(self, conn: sqlite3.Connection, md5: str, src_path: str) -> None:
+        target = self.object_path(md5)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(src_path, target)
+        conn.execute(
+            """
+            INSERT INTO objects (md5, size, last_used) VALUES (?, ?, ?)
+            ON CONFLICT(md5) DO UPDATE SET size = excluded.size, last_used = excluded.last_used
+            """,
+            (md5, os.path.getsize(target), time.time()),
+        )
+
+    def _link(self, md5: str, dest_path: str) -> None:
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        tmp_path = f"{dest_path}.link"
+        try:
+            os.link(self.object_path(md5), tmp_path)
+        except OSError:
+            # Hardlinks are unavailable across filesystems; fall back to a copy
+            shutil.copyfile(self.object_path(md5), tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def fetch(self, md5: str, dest_path: str, download: Callable[[str], None]) -> bool:
+        """Place the object with checksum ``md5`` at ``dest_path``.
+
+        On a miss ``download`` is called with a temporary path inside the
+        cache to write the file to; the result is stored and then linked.
+        Returns True if the object was already cached.
+        """
+        fetch_lock = self._fetch_locks[hash(md5) % len(self._fetch_locks)]
+        with fetch_lock, self.pin([md5]):
+            conn = self._connect()
+            try:
+                with conn:
+                    hit = self._lookup(conn, md5)
+                if not hit:
+                    fd, incoming = tempfile.mkstemp(
+                        prefix=f"{md5}.", dir=os.path.join(self.root, "incoming")
+                    )
+                    os.close(fd)
+                    try:
+                        download(incoming)
+                        with conn:
+                            self._add(conn, md5, incoming)
+                    finally:
+                        if os.path.exists(incoming):
+                            os.remove(incoming)
+                self._link(md5, dest_path)
+            finally:
+                conn.close()
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not hit:
+            self.evict()
+        return hit
+
+    @contextmanager
+    def pin(self, md5s: Iterable[str]) -> Iterator[None]:
+        """Protect the given objects from eviction for the duration of a block.
+
+        Objects that are not cached yet are pinned as soon as they are added.
+        """
+        md5s = list(md5s)
+        self._adjust_refs(md5s, 1)
+        try:
+            yield
+        finally:
+            self._adjust_refs(md5s, -1)
+
+    def _adjust_refs(self, md5s: Iterable[str], delta: int) -> None:
+        pid = os.getpid()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO pins (md5, pid, refs) VALUES (?, ?, ?)
+                    ON CONFLICT(md5, pid) DO UPDATE SET refs = refs + excluded.refs
+                    """,
+                    [(md5, pid, delta) for md5 in md5s],
+                )
+                conn.execute("DELETE FROM pins WHERE refs <= 0")
+        finally:
+            conn.close()
+
+    def _release_dead_pins(self, conn: sqlite3.Connection) -> None:
+        """Delete pins held by processes that are no longer running."""
+        dead = []
+        for (pid,) in conn.execute("SELECT DISTINCT pid FROM pins").fetchall():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                dead.append((pid,))
+            except OSError:
+                # The process exists but belongs to another user
+                pass
+        if dead:
+            with conn:
+                conn.executemany("DELETE FROM pins WHERE pid = ?", dead)
+
+    def evict(self) -> int:
+        """Evict unpinned objects, oldest first, until the budget is met.
+
+        Returns the number of objects removed. Project trees linked from an
+        evicted object keep their copy; only the cache entry goes away.
+        """
+        removed = 0
+        conn = self._connect()
+        try:
+            self._release_dead_pins(conn)
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+                if total <= self.budget_bytes:
+                    return 0
+                rows = conn.execute(
+                    "SELECT md5, size FROM objects "
+                    "WHERE md5 NOT IN (SELECT md5 FROM pins) ORDER BY last_used"
+                ).fetchall()
+                for md5, size in rows:
+                    if total <= self.budget_bytes:
+                        break
+                    try:
+                        os.remove(self.object_path(md5))
+                    except FileNotFoundError:
+                        pass
+                    conn.execute("DELETE FROM objects WHERE md5 = ?", (md5,))
+                    total -= size
+                    removed += 1
+        finally:
+            conn.close()
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and the bytes currently stored."""
+        conn = self._connect()
+        try:
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects"
+            ).fetchone()
+        finally:
+            conn.close()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "objects": count,
+                "bytes": total,
+                "budget_bytes": self.budget_bytes,
+            }
+
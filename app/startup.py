@@ -0,0 +1,77 @@
+"""Report how long the web app and Celery workers take to start.
+
+Run ``python -m app.startup`` from the project root. Every measurement runs
+in a fresh interpreter, so each figure is a cold start that includes the
+imports the target pulls in.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+# Modules whose cold import time is reported
+IMPORT_TARGETS = (
+    "app",
+    "app.models",
+    "app.drive_client",
+    "app.views.projects",
+    "app.celery_app",
+    "tasks.scheduler",
+)
+# Slow third-party modules that should only be loaded on first use
+HEAVY_MODULES = ("googleapiclient.discovery", "google_auth_oauthlib.flow", "flask")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "modules": len(sys.modules),
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def _probe(label: str, body: str) -> Dict[str, object]:
+    code = _PROBE.format(body=body, heavy=HEAVY_MODULES)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()
+        return {"target": label, "error": error[-1] if error else "failed"}
+    return {"target": label, **json.loads(proc.stdout.strip().splitlines()[-1])}
+
+
+def measure() -> List[Dict[str, object]]:
+    """Return cold import times for ``IMPORT_TARGETS`` and for ``create_app()``."""
+    results = [_probe(name, f"import {name}") for name in IMPORT_TARGETS]
+    results.append(_probe("create_app()", "from app import create_app\ncreate_app()"))
+    return results
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+    results = measure()
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for result in results:
+        if "error" in result:
+            print(f"{result['target']:<22} failed: {result['error']}")
+            continue
+        heavy = ", ".join(result["heavy"]) or "-"
+        print(
+            f"{result['target']:<22} {result['seconds'] * 1000:8.1f} ms "
+            f"{result['modules']:5d} modules  heavy: {heavy}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,68 +1,371 @@
 from __future__ import annotations
 
+import hashlib
 import json
-from pathlib import Path
-from typing import List
+import mmap
+import os
+import sqlite3
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePath
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 REQUIRED_FIELDS = {"title", "description"}
 THUMB_EXTS = {".jpg", ".jpeg", ".png"}
 
+# Threads used to check item folders in ``validate_project``
+DEFAULT_WORKERS = 8
 
-def _validate_item(dir_path: Path, errors: List[str]) -> None:
-    video = None
-    thumb = None
-    for p in dir_path.iterdir():
-        if p.is_file():
-            if p.suffix.lower() == ".mp4":
-                video = p
-            if p.suffix.lower() in THUMB_EXTS:
-                thumb = p
-    if video is None:
+# SQLite database holding item results reused by incremental validation
+CACHE_DB_PATH = os.path.join(os.path.dirname(__file__), "validation_cache.db")
+# Upper bound on bound parameters used in a single ``IN (...)`` clause
+MAX_IN_PARAMS = 500
+
+
+class Mp4Info(NamedTuple):
+    """Summary of an MP4 file returned by ``probe_mp4``."""
+
+    size: int
+    duration: Optional[float]
+
+
+def _mvhd_duration(mm: mmap.mmap, start: int, end: int) -> float:
+    """Return the duration in seconds stored in the ``mvhd`` box of a ``moov``."""
+    offset = start
+    while offset + 8 <= end:
+        box_size, box_type = struct.unpack_from(">I4s", mm, offset)
+        if box_size < 8 or offset + box_size > end:
+            break
+        if box_type == b"mvhd":
+            version = mm[offset + 8] if box_size > 8 else 0
+            if box_size < (40 if version == 1 else 28):
+                raise ValueError(f"truncated 'mvhd' box at offset {offset}")
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", mm, offset + 28)
+            else:
+                timescale, duration = struct.unpack_from(">II", mm, offset + 20)
+            if not timescale:
+                raise ValueError("'mvhd' box has a zero timescale")
+            return duration / timescale
+        offset += box_size
+    raise ValueError("'moov' box has no 'mvhd' header")
+
+
+def probe_mp4(path: Path) -> Mp4Info:
+    """Check the top-level ISO-BMFF box structure of an MP4 file.
+
+    The file is memory-mapped and only box headers are touched, so the
+    media payload is never read. The top-level boxes must tile the file
+    exactly and include ``ftyp`` and a complete ``moov`` box, whose
+    ``mvhd`` header provides the duration. Raises ``ValueError`` describing
+    the first problem found.
+    """
+    size = os.path.getsize(path)
+    if size < 8:
+        raise ValueError("file is too small to be an MP4 container")
+    seen = set()
+    duration = None
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = 0
+        while offset < size:
+            if size - offset < 8:
+                raise ValueError(f"truncated box header at offset {offset}")
+            box_size, raw_type = struct.unpack_from(">I4s", mm, offset)
+            box_type = raw_type.decode("latin-1")
+            header = 8
+            if box_size == 1:
+                if size - offset < 16:
+                    raise ValueError(f"truncated box header at offset {offset}")
+                box_size = struct.unpack_from(">Q", mm, offset + 8)[0]
+                header = 16
+            elif box_size == 0:
+                box_size = size - offset
+            if box_size < header:
+                raise ValueError(f"invalid size for '{box_type}' box at offset {offset}")
+            if offset + box_size > size:
+                raise ValueError(
+                    f"'{box_type}' box at offset {offset} extends past the end of the file"
+                )
+            if raw_type == b"moov":
+                duration = _mvhd_duration(mm, offset + header, offset + box_size)
+            seen.add(raw_type)
+            offset += box_size
+    if b"ftyp" not in seen:
+        raise ValueError("missing 'ftyp' box")
+    if b"moov" not in seen:
+        raise ValueError("missing 'moov' box")
+    return Mp4Info(size=size, duration=duration)
+
+
+def _scan(dir_path: Path) -> Tuple[List[str], List[str]]:
+    """List a directory once, returning sorted subdirectory and file names.
+
+    The entry types come from the ``DirEntry`` objects, which avoids a
+    separate ``stat`` call per entry on most platforms.
+    """
+    dirs: List[str] = []
+    files: List[str] = []
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            if entry.is_dir():
+                dirs.append(entry.name)
+            elif entry.is_file():
+                files.append(entry.name)
+    return sorted(dirs), sorted(files)
+
+
+def _check_item(
+    dir_path: PurePath,
+    files: List[str],
+    read_text: Callable[[PurePath], str] = Path.read_text,
+) -> List[str]:
+    """Return the errors of an item folder whose file names are ``files``.
+
+    ``read_text`` loads the contents of the item's ``metadata.json``.
+    """
+    errors: List[str] = []
+    suffixes = {os.path.splitext(name)[1].lower() for name in files}
+    if ".mp4" not in suffixes:
         errors.append(f"Missing .mp4 file in {dir_path}")
-    if thumb is None:
+    if not suffixes & THUMB_EXTS:
         errors.append(f"Missing thumbnail in {dir_path}")
 
     meta_path = dir_path / "metadata.json"
-    if not meta_path.exists():
+    if "metadata.json" not in files:
         errors.append(f"Missing metadata.json in {dir_path}")
-        return
+        return errors
     try:
-        data = json.loads(meta_path.read_text())
+        data = json.loads(read_text(meta_path))
     except json.JSONDecodeError:
         errors.append(f"Invalid JSON in {meta_path}")
-        return
-    for field in REQUIRED_FIELDS:
+        return errors
+    for field in sorted(REQUIRED_FIELDS):
         if field not in data:
             errors.append(f"Metadata missing field '{field}' in {meta_path}")
+    return errors
 
 
-def validate_project(base_path: Path) -> List[str]:
-    """Validate a project directory and return a list of error messages."""
+def _check_local_item(
+    dir_path: Path, files: List[str], check_containers: bool = False
+) -> List[str]:
+    """Check an item folder on disk, optionally probing its MP4 containers."""
+    errors = _check_item(dir_path, files)
+    if check_containers:
+        for name in files:
+            if name.lower().endswith(".mp4"):
+                try:
+                    probe_mp4(dir_path / name)
+                except (OSError, ValueError) as err:
+                    errors.append(f"Corrupt .mp4 file {dir_path / name}: {err}")
+    return errors
 
-    errors: List[str] = []
 
-    def walk(path: Path, in_shorts: bool = False) -> None:
-        shorts_dir = path / "shorts"
-        if in_shorts and shorts_dir.exists():
-            errors.append(f"Nested shorts directory not allowed: {shorts_dir}")
-        for entry in path.iterdir():
-            if entry.is_dir():
-                if entry.name == "shorts":
-                    if in_shorts:
-                        errors.append(
-                            f"Nested shorts directory not allowed: {entry}")
-                        continue
-                    walk(entry, True)
-                else:
-                    walk(entry, in_shorts)
-        if any(f.is_file() and f.suffix.lower() == ".mp4" for f in path.iterdir()):
-            _validate_item(path, errors)
+def _validate_item(dir_path: Path, errors: List[str], check_containers: bool = False) -> None:
+    errors.extend(_check_local_item(dir_path, _scan(dir_path)[1], check_containers))
+
+
+def _has_video(files: List[str]) -> bool:
+    return any(name.lower().endswith(".mp4") for name in files)
+
+
+# A validation plan entry: a structural error, or an item folder to check
+_Step = Union[str, Tuple[PurePath, List[str]]]
+
+
+def _plan(
+    base_path: PurePath,
+    scan: Callable[[PurePath], Tuple[List[str], List[str]]] = _scan,
+) -> List[_Step]:
+    """Walk the project tree, listing every directory exactly once.
+
+    ``scan`` returns the sorted subdirectory and file names of a directory.
+    """
+    steps: List[_Step] = []
+
+    def walk(path: PurePath, in_shorts: bool = False) -> None:
+        dirs, files = scan(path)
+        if in_shorts and "shorts" in dirs + files:
+            steps.append(f"Nested shorts directory not allowed: {path / 'shorts'}")
+        for name in dirs:
+            entry = path / name
+            if name == "shorts":
+                if in_shorts:
+                    steps.append(f"Nested shorts directory not allowed: {entry}")
+                    continue
+                walk(entry, True)
+            else:
+                walk(entry, in_shorts)
+        if _has_video(files):
+            steps.append((path, files))
 
     walk(base_path)
+    return steps
+
+
+def _fingerprint(dir_path: Path, files: List[str]) -> str:
+    """Hash the names, sizes and modification times of an item's files."""
+    digest = hashlib.sha1()
+    for name in files:
+        try:
+            st = os.stat(dir_path / name)
+        except FileNotFoundError:
+            continue
+        digest.update(f"{name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _cache_conn() -> sqlite3.Connection:
+    conn = sqlite3.connect(CACHE_DB_PATH, timeout=5)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS item_results (
+            path TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            errors TEXT NOT NULL
+        )
+        """
+    )
+    return conn
+
+
+def _load_cached(conn: sqlite3.Connection, paths: List[str]) -> Dict[str, Tuple[str, List[str]]]:
+    cached: Dict[str, Tuple[str, List[str]]] = {}
+    for start in range(0, len(paths), MAX_IN_PARAMS):
+        chunk = paths[start:start + MAX_IN_PARAMS]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = conn.execute(
+            "SELECT path, fingerprint, errors FROM item_results "
+            f"WHERE path IN ({placeholders})",
+            chunk,
+        )
+        for path, fingerprint, errors in rows:
+            cached[path] = (fingerprint, json.loads(errors))
+    return cached
+
+
+def _run(func, items: List, max_workers: int) -> Iterable:
+    if max_workers > 1 and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(func, items))
+    return [func(item) for item in items]
+
+
+def _check_items_incremental(
+    items: List[Tuple[Path, List[str]]], max_workers: int, check_containers: bool
+) -> List[List[str]]:
+    """Check item folders, reusing stored results for unchanged folders.
+
+    A folder is re-checked only when the fingerprint of its files differs
+    from the one stored with its previous result.
+    """
+    conn = _cache_conn()
+    try:
+        cached = _load_cached(conn, [str(path) for path, _ in items])
+
+        def check(item: Tuple[Path, List[str]]) -> Tuple[List[str], str, bool]:
+            path, files = item
+            fingerprint = _fingerprint(path, files)
+            if check_containers:
+                # Results with and without container checks are not interchangeable
+                fingerprint += "+mp4"
+            previous = cached.get(str(path))
+            if previous is not None and previous[0] == fingerprint:
+                return previous[1], fingerprint, False
+            return _check_local_item(path, files, check_containers), fingerprint, True
+
+        results = _run(check, items, max_workers)
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO item_results (path, fingerprint, errors) "
+                "VALUES (?, ?, ?)",
+                [
+                    (str(path), fingerprint, json.dumps(errors))
+                    for (path, _), (errors, fingerprint, changed) in zip(items, results)
+                    if changed
+                ],
+            )
+    finally:
+        conn.close()
+    return [errors for errors, _, _ in results]
+
+
+def _merge(steps: List[_Step], results: Iterator[List[str]]) -> List[str]:
+    """Combine structural errors and item results in walk order."""
+    errors: List[str] = []
+    for step in steps:
+        if isinstance(step, str):
+            errors.append(step)
+        else:
+            errors.extend(next(results))
     return errors
 
 
-def validate_folder(path: Path) -> List[str]:
+def clear_validation_cache() -> None:
+    """Forget all stored item results used by incremental validation."""
+    conn = _cache_conn()
+    try:
+        with conn:
+            conn.execute("DELETE FROM item_results")
+    finally:
+        conn.close()
+
+
+def validate_project(
+    base_path: Path,
+    max_workers: int = DEFAULT_WORKERS,
+    incremental: bool = False,
+    check_containers: bool = False,
+) -> List[str]:
+    """Validate a project directory and return a list of error messages.
+
+    The tree is walked once with ``os.scandir`` and the item folders found
+    are then checked on up to ``max_workers`` threads. Errors are reported
+    in walk order regardless of which thread produced them.
+
+    With ``incremental`` enabled, item results are stored in
+    ``CACHE_DB_PATH`` together with a fingerprint of the folder's files, and
+    only folders whose fingerprint changed since the last run are re-checked.
+
+    With ``check_containers`` enabled, every ``.mp4`` file is additionally
+    probed with ``probe_mp4`` to reject truncated or incomplete files.
+    """
+    steps = _plan(base_path)
+    items = [step for step in steps if not isinstance(step, str)]
+    if incremental:
+        results = iter(_check_items_incremental(items, max_workers, check_containers))
+    else:
+        results = iter(
+            _run(
+                lambda item: _check_local_item(item[0], item[1], check_containers),
+                items,
+                max_workers,
+            )
+        )
+    return _merge(steps, results)
+
+
+def validate_tree(
+    base_path: PurePath,
+    scan: Callable[[PurePath], Tuple[List[str], List[str]]],
+    read_text: Callable[[PurePath], str],
+    max_workers: int = 1,
+) -> List[str]:
+    """Validate a project tree that is not on the local filesystem.
+
+    Applies the same rules, and produces the same messages, as
+    ``validate_project``. ``scan`` returns the sorted subdirectory and file
+    names below a path and ``read_text`` returns the contents of a
+    ``metadata.json`` file.
+    """
+    steps = _plan(base_path, scan)
+    items = [step for step in steps if not isinstance(step, str)]
+    results = iter(
+        _run(lambda item: _check_item(item[0], item[1], read_text), items, max_workers)
+    )
+    return _merge(steps, results)
+
+
+def validate_folder(path: Path, check_containers: bool = False) -> List[str]:
     """Validate a single folder containing a video item.
 
     Returns a list of error messages describing any issues found. If the
@@ -74,5 +377,5 @@ def validate_folder(path: Path) -> List[str]:
         errors.append(f"{path} is not a directory")
         return errors
 
-    _validate_item(path, errors)
+    _validate_item(path, errors, check_containers)
     return errors
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from flask import Blueprint, Response, abort
+
+from .. import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics")
+def metrics_endpoint():
+    """Expose recorded metrics in the Prometheus text format."""
+    if not metrics.enabled():
+        abort(404)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
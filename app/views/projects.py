@@ -1,11 +1,93 @@
 from __future__ import annotations
 
-from flask import Blueprint, current_app, jsonify, render_template
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple
+
+from flask import Blueprint, current_app, jsonify, render_template, request
 
 from ..drive_client import list_folders
 
+logger = logging.getLogger(__name__)
+
 projects_bp = Blueprint("projects", __name__)
 
+# Largest page size accepted by ``/api/projects?limit=``
+MAX_PAGE_SIZE = 500
+
+
+class _Listing(NamedTuple):
+    folders: List[dict]
+    etag: str
+    last_modified: datetime
+    fetched_at: float
+
+
+class ProjectListCache:
+    """Drive project listings cached per path with stale-while-revalidate.
+
+    A listing older than ``ttl`` seconds is still served while a single
+    background thread fetches a fresh one. Only the very first request for
+    a path waits for Drive.
+    """
+
+    def __init__(self) -> None:
+        self._listings: Dict[str, _Listing] = {}
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+
+    def _fetch(self, path: str) -> _Listing:
+        try:
+            folders = list_folders(path)
+        except FileNotFoundError:
+            folders = []
+        body = json.dumps(folders, sort_keys=True).encode()
+        etag = hashlib.sha1(body).hexdigest()
+        now = time.time()
+        with self._lock:
+            previous = self._listings.get(path)
+            if previous is not None and previous.etag == etag:
+                last_modified = previous.last_modified
+            else:
+                last_modified = datetime.fromtimestamp(int(now), timezone.utc)
+            listing = _Listing(folders, etag, last_modified, now)
+            self._listings[path] = listing
+        return listing
+
+    def _refresh(self, path: str) -> None:
+        try:
+            self._fetch(path)
+        except Exception:
+            logger.exception("Refreshing project list for %s failed", path)
+        finally:
+            with self._lock:
+                self._refreshing.discard(path)
+
+    def get(self, path: str, ttl: float) -> _Listing:
+        """Return the listing for ``path``, refreshing it in the background if stale."""
+        with self._lock:
+            listing = self._listings.get(path)
+            stale = listing is not None and time.time() - listing.fetched_at > ttl
+            if stale and path not in self._refreshing:
+                self._refreshing.add(path)
+                threading.Thread(
+                    target=self._refresh, args=(path,), name="projects-refresh", daemon=True
+                ).start()
+        if listing is None:
+            listing = self._fetch(path)
+        return listing
+
+    def clear(self) -> None:
+        with self._lock:
+            self._listings.clear()
+
+
+project_cache = ProjectListCache()
+
 
 @projects_bp.route("/projects")
 def projects_page():
@@ -15,10 +97,35 @@ def projects_page():
 
 @projects_bp.route("/api/projects")
 def projects_api():
-    """Return available project folders from Google Drive."""
+    """Return available project folders from Google Drive.
+
+    Responses come from ``project_cache`` and carry ``ETag`` and
+    ``Last-Modified`` headers, so conditional requests get a ``304``. With
+    ``?limit=`` only one page is returned and the token for the next page
+    is sent in the ``X-Next-Page-Token`` header, to be passed back as
+    ``?page_token=``.
+    """
     path = current_app.config.get("PROJECTS_DRIVE_PATH", "projects")
-    try:
-        folders = list_folders(path)
-    except FileNotFoundError:
-        folders = []
-    return jsonify(folders)
+    ttl = current_app.config.get("PROJECTS_CACHE_TTL", 60)
+    listing = project_cache.get(path, ttl)
+
+    folders = listing.folders
+    etag = listing.etag
+    next_token = None
+    limit = request.args.get("limit", type=int)
+    if limit:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, request.args.get("page_token", 0, type=int))
+        folders = folders[offset:offset + limit]
+        etag = f"{etag}-{offset}-{limit}"
+        if offset + limit < len(listing.folders):
+            next_token = str(offset + limit)
+
+    response = jsonify(folders)
+    response.set_etag(etag)
+    response.last_modified = listing.last_modified
+    # Let clients cache the body but revalidate it on every use
+    response.cache_control.no_cache = True
+    if next_token is not None:
+        response.headers["X-Next-Page-Token"] = next_token
+    return response.make_conditional(request)
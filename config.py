@@ -33,6 +33,15 @@ class Config:
         "DEFAULT_UPLOAD_TIMES", "09:00"
     ).split(",")
 
+    # Scheduled uploads are published to workers this many seconds ahead
+    DISPATCH_WINDOW_SECONDS: int = int(os.getenv("DISPATCH_WINDOW_SECONDS", "300"))
+    # How often Celery beat runs the due-upload dispatcher
+    DISPATCH_INTERVAL_SECONDS: int = int(os.getenv("DISPATCH_INTERVAL_SECONDS", "60"))
+    # Schedule rows claimed per dispatcher transaction
+    DISPATCH_BATCH_SIZE: int = int(os.getenv("DISPATCH_BATCH_SIZE", "500"))
+    # Claimed schedules still unpublished after this many seconds are republished
+    DISPATCH_STALE_SECONDS: int = int(os.getenv("DISPATCH_STALE_SECONDS", "600"))
+
     # HTTPS/SSL settings
     USE_HTTPS: bool = _str_to_bool(os.getenv("USE_HTTPS"))
     SSL_CERT_PATH: Optional[str] = os.getenv("SSL_CERT_PATH")
@@ -40,3 +49,21 @@ class Config:
 
     # Path on Google Drive containing project folders
     PROJECTS_DRIVE_PATH: str = os.getenv("PROJECTS_DRIVE_PATH", "projects")
+    # Local mirror of the projects tree kept current from the Drive change feed
+    DRIVE_MIRROR_ENABLED: bool = _str_to_bool(os.getenv("DRIVE_MIRROR_ENABLED"))
+    DRIVE_MIRROR_PATH: str = os.getenv(
+        "DRIVE_MIRROR_PATH", os.path.join(os.path.dirname(__file__), "app", "drive_mirror.db")
+    )
+    # How often the mirror is synced, and how old it may get before it is ignored
+    DRIVE_SYNC_INTERVAL_SECONDS: int = int(os.getenv("DRIVE_SYNC_INTERVAL_SECONDS", "60"))
+    DRIVE_MIRROR_MAX_AGE: int = int(os.getenv("DRIVE_MIRROR_MAX_AGE", "300"))
+    # Seconds a cached project listing is served before being refreshed
+    PROJECTS_CACHE_TTL: int = int(os.getenv("PROJECTS_CACHE_TTL", "60"))
+
+    # Record metrics and expose them at /metrics in the Prometheus format
+    METRICS_ENABLED: bool = _str_to_bool(os.getenv("METRICS_ENABLED"))
+    # Directory where worker processes leave metrics for the web process
+    METRICS_DIR: Optional[str] = os.getenv("METRICS_DIR")
+    # Requests slower than this many seconds have their sampled stacks logged; 0 disables
+    SLOW_REQUEST_SECONDS: float = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+    PROFILE_SAMPLE_INTERVAL: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01"))
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from app import drive_client
+from app.celery_app import celery_app
+from app.drive_mirror import DriveMirror
+from config import Config
+
+_mirror: DriveMirror | None = None
+
+
+def get_mirror() -> DriveMirror:
+    """Return this process's handle on the configured Drive mirror."""
+    global _mirror
+    if _mirror is None:
+        _mirror = DriveMirror(Config.DRIVE_MIRROR_PATH)
+        drive_client.use_mirror(_mirror, Config.DRIVE_MIRROR_MAX_AGE)
+    return _mirror
+
+
+@celery_app.task(name="tasks.drive_sync.sync_drive_mirror")
+def sync_drive_mirror() -> Dict[str, int]:
+    """Apply pending Drive changes below ``PROJECTS_DRIVE_PATH`` to the mirror."""
+    return drive_client.sync_mirror(get_mirror(), Config.PROJECTS_DRIVE_PATH)
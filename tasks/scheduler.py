@@ -1,23 +1,142 @@
 from __future__ import annotations
 
-from datetime import datetime
+import logging
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
 
 from app.celery_app import celery_app
 from app import models
+from config import Config
 
+logger = logging.getLogger(__name__)
 
-@celery_app.task(name="tasks.scheduler.enqueue_uploads")
-def enqueue_uploads(project_id: int) -> int:
-    """Enqueue upload tasks for the given project based on its schedule."""
-    schedules = models.get_schedules(project_id)
-    count = 0
-    for item in schedules:
-        eta = datetime.fromisoformat(item["scheduled_at"])
-        celery_app.send_task(
-            "tasks.youtube.upload_video",
-            args=[project_id, item["id"], item.get("metadata")],
-            eta=eta,
+UPLOAD_TASK = "tasks.youtube.upload_video"
+# Namespace for the deterministic IDs of upload tasks
+UPLOAD_TASK_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, f"codex_uploader/{UPLOAD_TASK}")
+
+
+def upload_task_id(project_id: int, schedule_id: int) -> str:
+    """Return the task ID used for the upload of one schedule slot."""
+    return str(uuid.uuid5(UPLOAD_TASK_NAMESPACE, f"{project_id}:{schedule_id}"))
+
+
+def find_previous_upload(asset: Dict[str, Any], platform: str = "youtube") -> Dict[str, Any] | None:
+    """Return an earlier upload of identical content to ``platform``, if any.
+
+    ``asset`` is a Drive file resource with ``md5Checksum`` and ``size``.
+    Upload tasks should call this before transferring a file, and record
+    what they uploaded with ``models.record_upload``, so a clip reused
+    across projects is not downloaded and uploaded again.
+    """
+    if not asset.get("md5Checksum") or asset.get("size") is None:
+        return None
+    return models.find_upload(asset["md5Checksum"], int(asset["size"]), platform)
+
+
+def publish_uploads(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Publish upload tasks for claimed schedule rows.
+
+    All messages go out through one producer checked out from the broker
+    connection pool. Task IDs are derived from ``(project_id, schedule_id)``
+    and recorded on the schedule; a row listed twice is skipped. Rows that
+    fail to publish are released for the next dispatch. A slot republished
+    after a dispatcher crash reuses its task ID, but Celery does not
+    deduplicate by ID, so delivery is at-least-once and upload tasks must
+    tolerate running twice for a slot. Returns counts of ``published``,
+    ``skipped`` and ``failed`` rows.
+    """
+    stats = {"published": 0, "skipped": 0, "failed": 0}
+    published: Dict[int, str] = {}
+    pending = deque(rows)
+    try:
+        with celery_app.producer_or_acquire() as producer:
+            while pending:
+                item = pending.popleft()
+                task_id = upload_task_id(item["project_id"], item["id"])
+                if item["id"] in published:
+                    stats["skipped"] += 1
+                    continue
+                try:
+                    celery_app.send_task(
+                        UPLOAD_TASK,
+                        args=[item["project_id"], item["id"], item.get("metadata")],
+                        eta=datetime.fromisoformat(item["scheduled_at"]),
+                        task_id=task_id,
+                        producer=producer,
+                    )
+                except Exception:
+                    logger.exception("Failed publishing upload for schedule %s", item["id"])
+                    stats["failed"] += 1
+                    models.release_schedules([item["id"]])
+                    continue
+                published[item["id"]] = task_id
+                stats["published"] += 1
+    except Exception:
+        logger.exception("Broker unavailable; releasing %d schedule(s)", len(pending))
+        stats["failed"] += len(pending)
+        models.release_schedules(item["id"] for item in pending)
+    finally:
+        models.mark_schedules_published(published)
+    return stats
+
+
+def _publish_claimed(claim: Callable[[], List[Dict[str, Any]]], totals: Dict[str, int]) -> bool:
+    """Publish batches returned by ``claim`` until one comes back short.
+
+    Returns False if a batch had failures; released rows would be claimed
+    again straight away, so the caller should retry on the next tick.
+    """
+    while True:
+        rows = claim()
+        stats = publish_uploads(rows)
+        for key, value in stats.items():
+            totals[key] += value
+        if stats["failed"]:
+            return False
+        if len(rows) < Config.DISPATCH_BATCH_SIZE:
+            return True
+
+
+def _dispatch(project_id: int | None = None) -> Dict[str, int]:
+    """Claim and publish every schedule due within the dispatch window.
+
+    Schedules claimed by an earlier dispatch that never recorded a task ID
+    (e.g. because its worker died) are republished first.
+    """
+    now = datetime.now()
+    until = now + timedelta(seconds=Config.DISPATCH_WINDOW_SECONDS)
+    stale_before = now - timedelta(seconds=Config.DISPATCH_STALE_SECONDS)
+    totals = {"published": 0, "skipped": 0, "failed": 0}
+    limit = Config.DISPATCH_BATCH_SIZE
+    if _publish_claimed(
+        lambda: models.reclaim_stale_schedules(stale_before, project_id=project_id, limit=limit),
+        totals,
+    ):
+        _publish_claimed(
+            lambda: models.claim_due_schedules(until, project_id=project_id, limit=limit),
+            totals,
         )
-        count += 1
-    return count
+    return totals
+
+
+@celery_app.task(name="tasks.scheduler.dispatch_due_uploads")
+def dispatch_due_uploads() -> Dict[str, int]:
+    """Enqueue upload tasks for all schedules due within the dispatch window.
+
+    Runs periodically from Celery beat, so only near-term slots are ever
+    held by workers as ETA tasks.
+    """
+    return _dispatch()
+
+
+@celery_app.task(name="tasks.scheduler.enqueue_uploads")
+def enqueue_uploads(project_id: int) -> Dict[str, int]:
+    """Enqueue upload tasks for the project's schedules that are due soon.
 
+    Only slots within the dispatch window are published; later slots are
+    picked up by ``dispatch_due_uploads`` once they come due. Each slot is
+    claimed once, so calling this again does not enqueue duplicates.
+    """
+    return _dispatch(project_id)
@@ -0,0 +1,130 @@
+import contextlib
+import shutil
+import tempfile
+
+import pytest
+
+from fake_drive import FakeDrive, build_projects
+
+drive_client = pytest.importorskip("app.drive_client")
+models = pytest.importorskip("app.models")
+
+SIZES = [10, 100, 1000, 10000]
+
+
+@pytest.fixture
+def fake_drive(monkeypatch, tmp_path):
+    drive = FakeDrive()
+
+    @contextlib.contextmanager
+    def service():
+        yield drive
+
+    monkeypatch.setattr(drive_client, "_drive_service", service)
+    monkeypatch.setattr(models, "DB_PATH", str(tmp_path / "app.db"))
+    drive_client.use_rate_limiter(None)
+    drive_client.use_mirror(None)
+    drive_client.invalidate_path_cache()
+    yield drive
+    models.close_db()
+    drive_client.invalidate_path_cache()
+
+
+def _calls(drive):
+    return {"calls": dict(drive.calls), "bytes": drive.bytes_served}
+
+
+@pytest.mark.parametrize("items", SIZES)
+def test_list_folders(bench, fake_drive, items):
+    root = build_projects(fake_drive, items, projects=items)
+
+    def run():
+        drive_client.invalidate_path_cache()
+        fake_drive.calls.clear()
+        assert len(drive_client.list_folders(root)) == items
+        return _calls(fake_drive)
+
+    bench("list_folders", run, items=items)
+
+
+@pytest.mark.parametrize("items", SIZES)
+def test_walk_tree(bench, fake_drive, items):
+    root = build_projects(fake_drive, items, projects=max(1, items // 100))
+
+    def run():
+        fake_drive.calls.clear()
+        with drive_client._drive_service() as service:
+            folder_id = drive_client._resolve_path(service, root, use_cache=False)
+            listed = drive_client.walk_tree(service, folder_id)
+        return dict(_calls(fake_drive), listed=len(listed))
+
+    bench("walk_tree", run, items=items)
+
+
+@pytest.mark.parametrize("items", [10, 100, 1000])
+@pytest.mark.parametrize("file_size", [1024, 1024 * 1024])
+def test_download_folder(bench, fake_drive, items, file_size):
+    if items * file_size > 256 * 1024 * 1024:
+        pytest.skip("tree too large")
+    root = build_projects(fake_drive, items, file_size=file_size)
+
+    def setup():
+        fake_drive.calls.clear()
+        fake_drive.bytes_served = 0
+        return tempfile.mkdtemp()
+
+    def run(destination):
+        try:
+            stats = drive_client.download_folder(f"{root}/project0", destination)
+        finally:
+            shutil.rmtree(destination)
+        return dict(_calls(fake_drive), **stats)
+
+    bench("download_folder", run, setup=setup, items=items, file_size=file_size)
+
+
+@pytest.mark.parametrize("items", [100, 1000])
+def test_download_folder_sync_unchanged(bench, fake_drive, tmp_path, items):
+    root = build_projects(fake_drive, items)
+    destination = str(tmp_path / "out")
+    drive_client.download_folder(f"{root}/project0", destination, sync=True)
+
+    def run():
+        fake_drive.calls.clear()
+        stats = drive_client.download_folder(f"{root}/project0", destination, sync=True)
+        assert stats["skipped"] == items * 3
+        return dict(_calls(fake_drive), **stats)
+
+    bench("download_folder_sync_unchanged", run, items=items)
+
+
+@pytest.mark.parametrize("items", [10, 100, 1000])
+def test_validate_remote_project(bench, fake_drive, items):
+    root = build_projects(fake_drive, items)
+
+    def run():
+        fake_drive.calls.clear()
+        assert drive_client.validate_remote_project(f"{root}/project0") == []
+        return _calls(fake_drive)
+
+    bench("validate_remote_project", run, items=items)
+
+
+@pytest.mark.parametrize("memory_budget", [None, 4 * 1024 * 1024])
+def test_download_folder_memory_budget(bench, fake_drive, memory_budget):
+    root = build_projects(fake_drive, 50, file_size=4 * 1024 * 1024)
+
+    def setup():
+        fake_drive.calls.clear()
+        return tempfile.mkdtemp()
+
+    def run(destination):
+        try:
+            stats = drive_client.download_folder(
+                f"{root}/project0", destination, max_workers=8, memory_budget=memory_budget
+            )
+        finally:
+            shutil.rmtree(destination)
+        return dict(_calls(fake_drive), **stats)
+
+    bench("download_folder_memory_budget", run, setup=setup, memory_budget=memory_budget)
@@ -0,0 +1,83 @@
+import importlib.util
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+spec = importlib.util.spec_from_file_location("models", ROOT / "app" / "models.py")
+models = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(models)
+
+SIZES = [10, 100, 1000, 10000]
+START = datetime(2024, 1, 1, 9, 0)
+
+
+@pytest.fixture(autouse=True)
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "app.db"
+    monkeypatch.setattr(models, "DB_PATH", str(path))
+    yield path
+    models.close_db()
+
+
+def _slots(count):
+    return [START + timedelta(minutes=i) for i in range(count)]
+
+
+@pytest.mark.parametrize("rows", SIZES)
+def test_add_schedules(bench, rows):
+    project_id = models.save_project("folder", "Bench")
+    slots = _slots(rows)
+
+    def run():
+        assert models.add_schedules(project_id, slots) == rows
+
+    bench("models.add_schedules", run, rows=rows)
+
+
+@pytest.mark.parametrize("rows", SIZES)
+def test_get_schedules_for_projects(bench, rows):
+    projects = [models.save_project(f"folder{p}", f"P{p}") for p in range(10)]
+    for project_id in projects:
+        models.add_schedules(project_id, _slots(rows // 10 or 1))
+
+    def run():
+        result = models.get_schedules_for_projects(projects)
+        assert len(result) == len(projects)
+
+    bench("models.get_schedules_for_projects", run, rows=rows)
+
+
+@pytest.mark.parametrize("rows", SIZES)
+def test_claim_due_schedules(bench, rows):
+    project_id = models.save_project("folder", "Bench")
+
+    def setup():
+        models.add_schedules(project_id, _slots(rows))
+        return START + timedelta(minutes=rows)
+
+    def run(until):
+        claimed = 0
+        while True:
+            batch = models.claim_due_schedules(until, limit=500)
+            if not batch:
+                return {"claimed": claimed}
+            claimed += len(batch)
+
+    bench("models.claim_due_schedules", run, setup=setup, rows=rows)
+
+
+@pytest.mark.parametrize("rows", SIZES)
+def test_record_and_find_assets(bench, rows):
+    items = [
+        {"id": f"file{i}", "name": f"clip{i}.mp4", "md5Checksum": f"{i:032x}", "size": "1024"}
+        for i in range(rows)
+    ]
+
+    def run():
+        models.record_assets(items, "folder")
+        for item in items[:: max(1, rows // 100)]:
+            assert models.find_assets(item["md5Checksum"], 1024)
+
+    bench("models.record_and_find_assets", run, rows=rows)
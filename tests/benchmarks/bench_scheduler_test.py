@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+scheduler = pytest.importorskip("tasks.scheduler")
+models = pytest.importorskip("app.models")
+
+SIZES = [10, 100, 1000, 10000]
+
+
+@pytest.fixture(autouse=True)
+def memory_broker(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, "DB_PATH", str(tmp_path / "app.db"))
+    app = scheduler.celery_app
+    original = app.conf.broker_url
+    app.conf.broker_url = "memory://"
+    # Use a producer pool bound to the in-memory broker; kombu keeps one pool
+    # per connection, so it is shared by all tests and never closed here
+    monkeypatch.setattr(app, "_pool", None)
+    yield app
+    app.conf.broker_url = original
+    models.close_db()
+
+
+@pytest.mark.parametrize("rows", SIZES)
+def test_enqueue_uploads(bench, rows):
+    project_id = models.save_project("folder", "Bench")
+
+    def setup():
+        now = datetime.now()
+        models.add_schedules(project_id, [now + timedelta(seconds=i % 60) for i in range(rows)])
+
+    def run(_):
+        stats = scheduler.enqueue_uploads(project_id)
+        assert stats["published"] == rows
+        return stats
+
+    bench("scheduler.enqueue_uploads", run, setup=setup, rows=rows)
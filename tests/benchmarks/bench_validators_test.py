@@ -0,0 +1,76 @@
+import importlib.util
+import json
+import struct
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+spec = importlib.util.spec_from_file_location("validators", ROOT / "app" / "validators.py")
+validators = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(validators)
+
+SIZES = [10, 100, 1000, 10000]
+
+
+def _mp4(payload_size):
+    mvhd = struct.pack(">B3xIIII", 0, 0, 0, 1000, 5000) + b"\0" * 80
+    boxes = [
+        struct.pack(">I4s", 16, b"ftyp") + b"isom\0\0\0\0",
+        struct.pack(">I4s", 8 + 8 + len(mvhd), b"moov") + struct.pack(">I4s", 8 + len(mvhd), b"mvhd") + mvhd,
+        struct.pack(">I4s", 8 + payload_size, b"mdat") + b"\0" * payload_size,
+    ]
+    return b"".join(boxes)
+
+
+def build_local_project(base: Path, items: int, shorts_every: int = 10) -> Path:
+    """Write a valid project of ``items`` item folders, some of them shorts."""
+    video = _mp4(1024)
+    for index in range(items):
+        if shorts_every and index % shorts_every == 0:
+            folder = base / "shorts" / f"short{index}"
+        else:
+            folder = base / f"video{index}"
+        folder.mkdir(parents=True)
+        (folder / "video.mp4").write_bytes(video)
+        (folder / "thumbnail.jpg").write_bytes(b"thumb")
+        (folder / "metadata.json").write_text(
+            json.dumps({"title": f"Video {index}", "description": "Synthetic"})
+        )
+    return base
+
+
+@pytest.fixture(autouse=True)
+def cache_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(validators, "CACHE_DB_PATH", str(tmp_path / "validation_cache.db"))
+
+
+@pytest.mark.parametrize("items", SIZES)
+def test_validate_project(bench, tmp_path, items):
+    base = build_local_project(tmp_path / "project", items)
+
+    def run():
+        assert validators.validate_project(base) == []
+
+    bench("validate_project", run, items=items)
+
+
+@pytest.mark.parametrize("items", SIZES)
+def test_validate_project_incremental_warm(bench, tmp_path, items):
+    base = build_local_project(tmp_path / "project", items)
+    validators.validate_project(base, incremental=True)
+
+    def run():
+        assert validators.validate_project(base, incremental=True) == []
+
+    bench("validate_project_incremental_warm", run, items=items)
+
+
+@pytest.mark.parametrize("items", [10, 100, 1000])
+def test_validate_project_check_containers(bench, tmp_path, items):
+    base = build_local_project(tmp_path / "project", items)
+
+    def run():
+        assert validators.validate_project(base, check_containers=True) == []
+
+    bench("validate_project_check_containers", run, items=items)
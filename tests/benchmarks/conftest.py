@@ -0,0 +1,76 @@
+"""Benchmarks for the Drive, validation, model and scheduling hot paths.
+
+They only run when ``RUN_BENCHMARKS`` is set, e.g.::
+
+    RUN_BENCHMARKS=1 BENCH_OUTPUT=bench.json python -m pytest tests/benchmarks -q
+
+Results are written as JSON to ``BENCH_OUTPUT`` (default
+``bench_results.json`` in the repository root, which git ignores). ``BENCH_LATENCY_MS`` adds simulated latency to
+every fake Drive call.
+"""
+
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+if not os.environ.get("RUN_BENCHMARKS"):
+    collect_ignore_glob = ["*_test.py"]
+
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", "3"))
+
+_results = []
+
+
+class Bench:
+    """Time a callable over several rounds and record the result."""
+
+    def __call__(self, name, func, setup=None, rounds=ROUNDS, **params):
+        timings = []
+        extra = {}
+        for _ in range(rounds):
+            state = setup() if setup is not None else None
+            start = time.perf_counter()
+            value = func() if setup is None else func(state)
+            timings.append(time.perf_counter() - start)
+            if isinstance(value, dict):
+                extra = value
+        result = {
+            "name": name,
+            "params": params,
+            "rounds": rounds,
+            "min_seconds": min(timings),
+            "median_seconds": statistics.median(timings),
+            "extra": extra,
+        }
+        _results.append(result)
+        return result
+
+
+@pytest.fixture
+def bench():
+    return Bench()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results:
+        return
+    output = os.environ.get("BENCH_OUTPUT", str(ROOT / "bench_results.json"))
+    report = {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "latency_seconds": float(os.environ.get("BENCH_LATENCY_MS", "0")) / 1000,
+        "results": _results,
+    }
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
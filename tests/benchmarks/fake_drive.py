@@ -0,0 +1,250 @@
+"""In-process stand-in for the parts of the Drive v3 API used by ``app.drive_client``."""
+
+import hashlib
+import http.client
+import itertools
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+# Seconds spent on every fake API call unless given explicitly
+DEFAULT_LATENCY = float(os.environ.get("BENCH_LATENCY_MS", "0")) / 1000
+
+_PARENT_RE = re.compile(r"'([^']+)' in parents")
+_NAME_RE = re.compile(r"name='((?:[^'\\]|\\.)*)'")
+_MIME_RE = re.compile(r"mimeType(!?=)'([^']+)'")
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d+)")
+
+
+class Response(dict):
+    """httplib2-style response: a dict of headers with a ``status``."""
+
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+        self.reason = http.client.responses.get(status, "")
+
+
+class _Request:
+    def __init__(self, drive, method_id, func):
+        self.methodId = method_id
+        self._drive = drive
+        self._func = func
+
+    def execute(self):
+        self._drive.call(self.methodId)
+        return self._func()
+
+
+class _Http:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def request(self, uri, method="GET", headers=None):
+        file_id = uri.rsplit("/", 1)[-1]
+        data = self._drive.content[file_id]
+        if self._drive.take_media_failure(file_id):
+            self._drive.call("media")
+            return Response(503), b""
+        match = _RANGE_RE.match((headers or {}).get("range", ""))
+        if not match or self._drive.ignore_range:
+            self._drive.call("media", len(data))
+            return Response(200), data
+        start, end = int(match.group(1)), int(match.group(2))
+        if start >= len(data):
+            self._drive.call("media")
+            return Response(416), b""
+        chunk = data[start:end + 1]
+        self._drive.call("media", len(chunk))
+        content_range = f"bytes {start}-{start + len(chunk) - 1}/{len(data)}"
+        return Response(206, {"content-range": content_range}), chunk
+
+
+class _MediaRequest(_Request):
+    def __init__(self, drive, file_id):
+        super().__init__(drive, "drive.files.get_media", lambda: drive.content[file_id])
+        self.uri = f"https://fake.drive/files/{file_id}"
+        self.headers = {}
+        self.http = _Http(drive)
+
+
+class _Batch:
+    def __init__(self, drive, callback):
+        self._drive = drive
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id):
+        self._requests.append((request, request_id))
+
+    def execute(self):
+        self._drive.call("batch")
+        for request, request_id in self._requests:
+            try:
+                response, error = request._func(), None
+            except Exception as err:
+                response, error = None, err
+            self._callback(request_id, response, error)
+
+
+class _Files:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, q="", fields=None, pageSize=None, pageToken=None, **kwargs):
+        return _Request(
+            self._drive, "drive.files.list", lambda: self._drive.list(q, pageSize, pageToken)
+        )
+
+    def get_media(self, fileId):
+        return _MediaRequest(self._drive, fileId)
+
+
+class _Changes:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def getStartPageToken(self):
+        return _Request(self._drive, "drive.changes.getStartPageToken", lambda: {"startPageToken": "1"})
+
+    def list(self, pageToken=None, **kwargs):
+        return _Request(
+            self._drive,
+            "drive.changes.list",
+            lambda: {"changes": [], "newStartPageToken": pageToken},
+        )
+
+
+class FakeDrive:
+    """A Drive service serving a synthetic tree held in memory.
+
+    ``latency`` seconds are spent on every API call and ``bandwidth`` (bytes
+    per second, optional) limits media transfers. ``max_page_size`` caps
+    ``files().list`` pages the way Drive does. ``calls`` counts requests by
+    kind and ``bytes_served`` the media bytes returned. Setting
+    ``ignore_range`` makes media requests return the whole body with status
+    200, and ``media_failures`` answers that many media requests with 503;
+    media requests for the IDs in ``broken`` always fail that way.
+    """
+
+    def __init__(self, latency=DEFAULT_LATENCY, bandwidth=None, max_page_size=1000):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.max_page_size = max_page_size
+        self.items = {}
+        self.content = {}
+        self.calls = Counter()
+        self.bytes_served = 0
+        self.ignore_range = False
+        self.media_failures = 0
+        self.broken = set()
+        self._children = defaultdict(list)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # -- building trees -----------------------------------------------------
+
+    def add(self, name, parent="root", data=None, mime_type=None):
+        file_id = f"f{next(self._ids)}"
+        if data is None and mime_type is None:
+            mime_type = FOLDER_MIME_TYPE
+        item = {
+            "id": file_id,
+            "name": name,
+            "mimeType": mime_type or "application/octet-stream",
+            "parents": [parent],
+            "modifiedTime": "2024-01-01T00:00:00.000Z",
+        }
+        if data is not None:
+            item["size"] = str(len(data))
+            item["md5Checksum"] = hashlib.md5(data).hexdigest()
+            self.content[file_id] = data
+        self.items[file_id] = item
+        self._children[parent].append(file_id)
+        return file_id
+
+    def remove(self, file_id):
+        """Delete ``file_id`` and, for a folder, everything below it."""
+        item = self.items.pop(file_id)
+        self.content.pop(file_id, None)
+        for parent in item["parents"]:
+            if file_id in self._children.get(parent, ()):
+                self._children[parent].remove(file_id)
+        for child in self._children.pop(file_id, []):
+            self.remove(child)
+
+    # -- API surface --------------------------------------------------------
+
+    def files(self):
+        return _Files(self)
+
+    def changes(self):
+        return _Changes(self)
+
+    def new_batch_http_request(self, callback):
+        return _Batch(self, callback)
+
+    def call(self, kind, nbytes=0):
+        with self._lock:
+            self.calls[kind] += 1
+            self.bytes_served += nbytes
+        delay = self.latency
+        if self.bandwidth and nbytes:
+            delay += nbytes / self.bandwidth
+        if delay:
+            time.sleep(delay)
+
+    def take_media_failure(self, file_id):
+        with self._lock:
+            if file_id in self.broken:
+                return True
+            if self.media_failures <= 0:
+                return False
+            self.media_failures -= 1
+            return True
+
+    def list(self, q, page_size, page_token):
+        parents = _PARENT_RE.findall(q)
+        for parent in parents:
+            if parent != "root" and parent not in self.items:
+                from googleapiclient.errors import HttpError
+
+                raise HttpError(Response(404), b'{"error": {"code": 404}}')
+        matches = [self.items[i] for parent in parents for i in self._children.get(parent, ())]
+        name = _NAME_RE.search(q)
+        if name:
+            wanted = re.sub(r"\\(.)", r"\1", name.group(1))
+            matches = [item for item in matches if item["name"] == wanted]
+        mime = _MIME_RE.search(q)
+        if mime:
+            op, value = mime.groups()
+            matches = [item for item in matches if (item["mimeType"] == value) == (op == "=")]
+        size = min(page_size or 100, self.max_page_size)
+        start = int(page_token or 0)
+        response = {"files": [dict(item) for item in matches[start:start + size]]}
+        if start + size < len(matches):
+            response["nextPageToken"] = str(start + size)
+        return response
+
+
+def build_projects(drive, items, projects=1, file_size=1024, root_name="projects"):
+    """Add ``projects`` project folders holding ``items`` item folders in total.
+
+    Every item folder contains a video, a thumbnail and a valid
+    ``metadata.json``; files get distinct contents of ``file_size`` bytes.
+    Returns the name of the root folder.
+    """
+    root = drive.add(root_name)
+    project_ids = [drive.add(f"project{p}", root) for p in range(projects)]
+    for index in range(items):
+        folder = drive.add(f"video{index}", project_ids[index % projects])
+        body = index.to_bytes(8, "big") * (file_size // 8 + 1)
+        drive.add("video.mp4", folder, body[:file_size], "video/mp4")
+        drive.add("thumbnail.jpg", folder, body[:64], "image/jpeg")
+        metadata = b'{"title": "Video %d", "description": "Synthetic"}' % index
+        drive.add("metadata.json", folder, metadata, "application/json")
+    return root_name
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import sqlite3
+import sys
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1].parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+pytest.importorskip("flask")
+credentials = pytest.importorskip("google.oauth2.credentials")
+exceptions = pytest.importorskip("google.auth.exceptions")
+auth = pytest.importorskip("app.auth")
+
+
+def make_credentials(token: str, expires_in: timedelta):
+    return credentials.Credentials(
+        token=token,
+        refresh_token="refresh",
+        client_id="client",
+        client_secret="secret",
+        token_uri="https://oauth2.googleapis.com/token",
+        scopes=auth.SCOPES,
+        expiry=datetime.utcnow() + expires_in,
+    )
+
+
+@pytest.fixture
+def refreshes(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(auth, "DB_PATH", str(tmp_path / "tokens.db"))
+    monkeypatch.setattr(auth, "_cached_credentials", None)
+    calls = []
+
+    def refresh(self, request):
+        calls.append(self.token)
+        self.token = f"token-{len(calls)}"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    monkeypatch.setattr(credentials.Credentials, "refresh", refresh)
+    return calls
+
+
+def stored_token() -> str:
+    conn = sqlite3.connect(auth.DB_PATH)
+    try:
+        return auth._read_credentials(conn).token
+    finally:
+        conn.close()
+
+
+def test_expired_token_is_refreshed_once_and_cached(refreshes):
+    auth._store_credentials(make_credentials("old", timedelta(minutes=-1)))
+    auth._cached_credentials = None
+
+    assert auth.get_credentials().token == "token-1"
+    assert auth.get_credentials().token == "token-1"
+    assert refreshes == ["old"]
+    assert stored_token() == "token-1"
+
+
+def test_waiter_uses_token_refreshed_by_lock_holder(refreshes):
+    # Another process refreshed the token while this one waited for the lock
+    auth._store_credentials(make_credentials("fresh", timedelta(hours=1)))
+    stale = make_credentials("old", timedelta(minutes=-1))
+
+    assert auth._refresh_credentials(stale).token == "fresh"
+    assert refreshes == []
+
+
+def test_early_refresh_skipped_while_another_process_refreshes(refreshes):
+    auth._store_credentials(make_credentials("old", timedelta(minutes=3)))
+    holder = sqlite3.connect(auth.DB_PATH, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        creds = make_credentials("old", timedelta(minutes=3))
+        assert auth._refresh_credentials(creds) is creds
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert refreshes == []
+
+
+def test_failed_early_refresh_keeps_valid_token(refreshes, monkeypatch):
+    auth._store_credentials(make_credentials("old", timedelta(minutes=3)))
+    auth._cached_credentials = None
+
+    def fail(self, request):
+        raise exceptions.RefreshError("token endpoint unavailable")
+
+    monkeypatch.setattr(credentials.Credentials, "refresh", fail)
+    assert auth.get_credentials().token == "old"
+    assert stored_token() == "old"
+
+
+def test_failed_refresh_of_expired_token_raises(refreshes, monkeypatch):
+    auth._store_credentials(make_credentials("old", timedelta(minutes=-1)))
+    auth._cached_credentials = None
+
+    def fail(self, request):
+        raise exceptions.RefreshError("token endpoint unavailable")
+
+    monkeypatch.setattr(credentials.Credentials, "refresh", fail)
+    with pytest.raises(exceptions.RefreshError):
+        auth.get_credentials()
@@ -0,0 +1,348 @@
+from pathlib import Path
+import contextlib
+import hashlib
+import importlib.util
+import sys
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1].parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+pytest.importorskip("googleapiclient")
+drive_client = pytest.importorskip("app.drive_client")
+models = pytest.importorskip("app.models")
+HttpError = pytest.importorskip("googleapiclient.errors").HttpError
+
+spec = importlib.util.spec_from_file_location(
+    "fake_drive", ROOT / "tests" / "benchmarks" / "fake_drive.py"
+)
+fake_drive = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(fake_drive)
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def drive(monkeypatch, tmp_path: Path):
+    drive = fake_drive.FakeDrive(latency=0)
+
+    @contextlib.contextmanager
+    def service():
+        yield drive
+
+    monkeypatch.setattr(drive_client, "_drive_service", service)
+    monkeypatch.setattr(models, "DB_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setattr(drive_client, "_rate_limiter", None)
+    drive_client.use_mirror(None)
+    drive_client.invalidate_path_cache()
+    yield drive
+    models.close_db()
+    drive_client.invalidate_path_cache()
+
+
+def download(file_id: str, dest: Path, **kwargs) -> None:
+    drive_client.download_file(
+        file_id, str(dest), md5_checksum=hashlib.md5(DATA).hexdigest(), **kwargs
+    )
+
+
+def test_download_resumes_from_partial_file(drive, tmp_path: Path):
+    file_id = drive.add("clip.mp4", data=DATA)
+    dest = tmp_path / "out" / "clip.mp4"
+    dest.parent.mkdir()
+    Path(f"{dest}.part").write_bytes(DATA[:4000])
+
+    download(file_id, dest, size=len(DATA), chunk_size=1024)
+    assert dest.read_bytes() == DATA
+    assert drive.bytes_served == len(DATA) - 4000
+    assert not Path(f"{dest}.part").exists()
+
+
+def test_corrupt_partial_file_is_fetched_again(drive, tmp_path: Path):
+    file_id = drive.add("clip.mp4", data=DATA)
+    dest = tmp_path / "out" / "clip.mp4"
+    dest.parent.mkdir()
+    Path(f"{dest}.part").write_bytes(b"\0" * 4000)
+
+    download(file_id, dest, size=len(DATA), chunk_size=1024)
+    assert dest.read_bytes() == DATA
+    assert drive.bytes_served == len(DATA) - 4000 + len(DATA)
+
+
+def test_server_ignoring_range_restarts_from_the_beginning(drive, tmp_path: Path):
+    file_id = drive.add("clip.mp4", data=DATA)
+    dest = tmp_path / "out" / "clip.mp4"
+    dest.parent.mkdir()
+    Path(f"{dest}.part").write_bytes(DATA[:4000])
+    drive.ignore_range = True
+
+    download(file_id, dest, size=len(DATA), chunk_size=1024)
+    assert dest.read_bytes() == DATA
+    assert drive.calls["media"] == 1
+
+
+def test_range_past_end_finishes_download_of_unknown_size(drive, tmp_path: Path):
+    file_id = drive.add("clip.mp4", data=DATA)
+    dest = tmp_path / "out" / "clip.mp4"
+    dest.parent.mkdir()
+    Path(f"{dest}.part").write_bytes(DATA)
+
+    download(file_id, dest)
+    assert dest.read_bytes() == DATA
+    assert drive.calls["media"] == 1
+    assert drive.bytes_served == 0
+
+
+def test_server_errors_are_retried_with_backoff(drive, tmp_path: Path, monkeypatch):
+    delays = []
+    monkeypatch.setattr(drive_client.time, "sleep", delays.append)
+    file_id = drive.add("clip.mp4", data=DATA)
+    dest = tmp_path / "out" / "clip.mp4"
+    drive.media_failures = 2
+
+    download(file_id, dest, size=len(DATA))
+    assert dest.read_bytes() == DATA
+    assert len(delays) == 2
+    assert delays[0] <= drive_client.DOWNLOAD_RETRY_BACKOFF < delays[1]
+
+    drive.media_failures = drive_client.DOWNLOAD_RETRIES + 1
+    with pytest.raises(RuntimeError, match="Failed downloading"):
+        download(file_id, tmp_path / "out" / "again.mp4", size=len(DATA))
+
+
+def test_sync_skips_unchanged_files(drive, tmp_path: Path):
+    root = fake_drive.build_projects(drive, 2)
+    destination = tmp_path / "out"
+    first = drive_client.download_folder(f"{root}/project0", str(destination), sync=True)
+    assert first["downloaded"] == 6
+
+    drive.calls.clear()
+    second = drive_client.download_folder(f"{root}/project0", str(destination), sync=True)
+    assert (second["downloaded"], second["skipped"]) == (0, 6)
+    assert drive.calls["media"] == 0
+
+
+def test_sync_deletes_files_removed_on_drive(drive, tmp_path: Path):
+    root = fake_drive.build_projects(drive, 2)
+    destination = tmp_path / "out"
+    drive_client.download_folder(f"{root}/project0", str(destination), sync=True)
+    removed = next(i for i, item in drive.items.items() if item["name"] == "thumbnail.jpg")
+    drive.remove(removed)
+
+    stats = drive_client.download_folder(
+        f"{root}/project0", str(destination), sync=True, delete_removed=True
+    )
+    assert (stats["deleted"], stats["skipped"]) == (1, 5)
+    assert not (destination / "video0" / "thumbnail.jpg").exists()
+    assert (destination / "video1" / "thumbnail.jpg").exists()
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_progress_reports_destination_path(drive, tmp_path: Path, cached):
+    root = fake_drive.build_projects(drive, 1)
+    destination = tmp_path / "out"
+    cache = None
+    if cached:
+        staging = pytest.importorskip("app.staging")
+        cache = staging.StagingCache(str(tmp_path / "cache"), budget_bytes=1 << 20)
+    reports = []
+
+    drive_client.download_folder(
+        f"{root}/project0", str(destination), cache=cache, progress=reports.append
+    )
+    assert {Path(p.path) for p in reports} == {
+        destination / "video0" / name for name in ("video.mp4", "thumbnail.jpg", "metadata.json")
+    }
+    assert all(p.done == p.total for p in reports)
+
+
+def test_cached_prefix_is_shared_by_sibling_paths(drive):
+    root = fake_drive.build_projects(drive, 2, projects=2)
+    before = drive_client._path_cache.stats()
+    with drive_client._drive_service() as service:
+        first = drive_client._resolve_path(service, f"{root}/project0")
+        drive.calls.clear()
+        second = drive_client._resolve_path(service, f"{root}/project1")
+        assert drive.calls["drive.files.list"] == 1
+
+        drive.calls.clear()
+        assert drive_client._resolve_path(service, f"{root}/project0") == first
+        assert drive_client._resolve_path(service, f"{root}/project1") == second
+        assert drive.calls["drive.files.list"] == 0
+    stats = drive_client._path_cache.stats()
+    assert stats["hits"] - before["hits"] == 5
+    assert stats["misses"] - before["misses"] == 3
+    assert stats["size"] == 3
+
+
+def test_recreated_root_is_resolved_again(drive):
+    root = fake_drive.build_projects(drive, 1)
+    with drive_client._drive_service() as service:
+        stale = drive_client._resolve_path(service, f"{root}/project0")
+    root_id = next(i for i, item in drive.items.items() if item["name"] == root)
+    drive.remove(root_id)
+    new_root = drive.add(root)
+    project = drive.add("project0", new_root)
+    drive.add("fresh", project)
+
+    # A 404 listing the cached folder triggers a fresh resolution
+    assert [f["name"] for f in drive_client.list_folders(f"{root}/project0")] == ["fresh"]
+    with drive_client._drive_service() as service:
+        assert drive_client._resolve_path(service, f"{root}/project0") == project != stale
+        # A lookup below a stale cached folder is retried from the root
+        drive_client.invalidate_path_cache()
+        drive_client._path_cache.set(f"{root}/project0", stale)
+        fresh = drive_client._resolve_path(service, f"{root}/project0/fresh")
+        assert fresh == drive._children[project][0]
+
+
+def test_batched_lookups_are_chunked_with_per_item_errors(drive):
+    root = drive.add("projects")
+    names = [f"item{i}" for i in range(250)]
+    for name in names[:-1]:
+        drive.add(name, root)
+
+    found, errors = drive_client.find_child_folders("projects", names)
+    assert drive.calls["batch"] == 3
+    assert errors == {}
+    assert found["item0"] == drive._children[root][0]
+    assert found[names[-1]] is None
+
+    found, errors = drive_client.find_files([root, "missing"], "item0")
+    assert found == {root: drive.items[drive._children[root][0]]}
+    assert set(errors) == {"missing"}
+    assert errors["missing"].resp.status == 404
+
+
+def test_failed_or_incomplete_batches_are_reported_per_item(drive, monkeypatch):
+    root = drive.add("projects")
+    drive.add("alpha", root)
+
+    def broken(self):
+        raise OSError("connection reset")
+
+    monkeypatch.setattr(fake_drive._Batch, "execute", broken)
+    found, errors = drive_client.find_child_folders("projects", ["alpha", "beta"])
+    assert found == {}
+    assert {name: type(err) for name, err in errors.items()} == {
+        "alpha": OSError,
+        "beta": OSError,
+    }
+
+    monkeypatch.setattr(fake_drive._Batch, "execute", lambda self: None)
+    found, errors = drive_client.find_child_folders("projects", ["alpha"])
+    assert found == {}
+    assert isinstance(errors["alpha"], RuntimeError)
+
+
+def test_throttled_batch_items_are_sent_again(drive, monkeypatch):
+    root = drive.add("projects")
+    alpha = drive.add("alpha", root)
+    drive.add("beta", root)
+    throttled = []
+    list_files = drive.list
+
+    def list_once_throttled(q, page_size, page_token):
+        if "alpha" in q and not throttled:
+            throttled.append(q)
+            raise HttpError(fake_drive.Response(429), b"")
+        return list_files(q, page_size, page_token)
+
+    class Limiter:
+        backoffs = 0
+
+        def call(self, func, cost=1):
+            return func()
+
+        def throttled(self, retry_after=None):
+            self.backoffs += 1
+
+    limiter = Limiter()
+    monkeypatch.setattr(drive, "list", list_once_throttled)
+    monkeypatch.setattr(drive_client, "_rate_limiter", limiter)
+    found, errors = drive_client.find_child_folders("projects", ["alpha", "beta"])
+    assert errors == {}
+    assert found["alpha"] == alpha
+    assert limiter.backoffs == 1
+    assert drive.calls["batch"] == 2
+
+
+def upload_tree(drive, local: Path, parent: str) -> None:
+    for entry in sorted(local.iterdir()):
+        if entry.is_dir():
+            upload_tree(drive, entry, drive.add(entry.name, parent))
+        else:
+            drive.add(entry.name, parent, entry.read_bytes())
+
+
+def test_remote_validation_matches_local_errors(drive, tmp_path: Path):
+    validators = pytest.importorskip("app.validators")
+    project = tmp_path / "projects" / "demo"
+    item = b'{"title": "t", "description": "d"}'
+    layout = {
+        "video1": {"video.mp4": b"v", "metadata.json": item},
+        "video2": {"video.mp4": b"v", "thumbnail.jpg": b"t", "metadata.json": b"{ not json"},
+        "video3": {"video.mp4": b"v", "thumbnail.jpg": b"t", "metadata.json": b'{"title": "t"}'},
+        "shorts/a/shorts/b": {"video.mp4": b"v", "thumbnail.jpg": b"t", "metadata.json": item},
+        "shorts/ok": {"video.mp4": b"v", "thumbnail.jpg": b"t", "metadata.json": item},
+    }
+    for folder, files in layout.items():
+        (project / folder).mkdir(parents=True)
+        for name, data in files.items():
+            (project / folder / name).write_bytes(data)
+    upload_tree(drive, tmp_path / "projects", drive.add("projects"))
+
+    local = validators.validate_project(project)
+    for kind in ("Nested shorts", "Missing thumbnail", "Invalid JSON", "Metadata missing field"):
+        assert any(error.startswith(kind) for error in local)
+    remote = drive_client.validate_remote_project("projects/demo")
+    assert remote == [error.replace(f"{tmp_path}/", "") for error in local]
+
+
+def test_failed_files_do_not_stop_the_others(drive, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(drive_client.time, "sleep", lambda seconds: None)
+    root = fake_drive.build_projects(drive, 4)
+    videos = [i for i, item in drive.items.items() if item["name"] == "video.mp4"]
+    drive.broken = set(videos[:2])
+    destination = tmp_path / "out"
+
+    with pytest.raises(drive_client.DownloadError) as excinfo:
+        drive_client.download_folder(
+            f"{root}/project0", str(destination), max_workers=4, sync=True
+        )
+    failures = excinfo.value.failures
+    assert sorted(file_id for file_id, _, _ in failures) == sorted(videos[:2])
+    assert all(isinstance(err, RuntimeError) for _, _, err in failures)
+    assert {Path(dest) for _, dest, _ in failures} == {
+        destination / "video0" / "video.mp4",
+        destination / "video1" / "video.mp4",
+    }
+    assert (destination / "video2" / "video.mp4").exists()
+    assert len(list(destination.rglob("metadata.json"))) == 4
+    assert not (destination / "video0" / "video.mp4").exists()
+
+    # Only the failed files are fetched by the next sync
+    drive.broken.clear()
+    stats = drive_client.download_folder(f"{root}/project0", str(destination), sync=True)
+    assert (stats["downloaded"], stats["skipped"]) == (2, 10)
+
+
+def test_iter_file_streams_in_chunks(drive):
+    file_id = drive.add("clip.mp4", data=DATA)
+    chunks = list(drive_client.iter_file(file_id, size=len(DATA), chunk_size=1024))
+    assert b"".join(chunks) == DATA
+    assert max(len(chunk) for chunk in chunks) == 1024
+
+    # Unknown size: the stream ends with the 416 past the last byte
+    assert b"".join(drive_client.iter_file(file_id, chunk_size=4096)) == DATA
+
+
+def test_iter_file_drops_bytes_resent_by_server_ignoring_range(drive):
+    file_id = drive.add("clip.mp4", data=DATA)
+    stream = drive_client.iter_file(file_id, size=len(DATA), chunk_size=1024)
+    first = next(stream)
+    drive.ignore_range = True
+    rest = b"".join(stream)
+    assert first + rest == DATA
+    assert drive.calls["media"] == 2
@@ -0,0 +1,129 @@
+from pathlib import Path
+import importlib.util
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1].parent
+spec = importlib.util.spec_from_file_location("drive_mirror", ROOT / "app" / "drive_mirror.py")
+drive_mirror = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(drive_mirror)
+
+FOLDER = drive_mirror.FOLDER_MIME_TYPE
+
+
+class _Call:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeChanges:
+    """Serves queued ``changes.list`` pages, two changes per page."""
+
+    def __init__(self):
+        self.queued = []
+        self.token = 0
+
+    def changes(self):
+        return self
+
+    def list(self, pageToken, **kwargs):
+        start = int(pageToken)
+        page = self.queued[start:start + 2]
+        response = {"changes": page}
+        if start + 2 < len(self.queued):
+            response["nextPageToken"] = str(start + 2)
+        else:
+            response["newStartPageToken"] = str(len(self.queued))
+        return _Call(response)
+
+
+def item(file_id, name, parent, mime="video/mp4", **extra):
+    return {"id": file_id, "name": name, "mimeType": mime, "parents": [parent], **extra}
+
+
+@pytest.fixture
+def mirror(tmp_path: Path):
+    mirror = drive_mirror.DriveMirror(str(tmp_path / "mirror.db"))
+    mirror.reset(
+        "root",
+        "/projects/",
+        [
+            item("p1", "alpha", "root", FOLDER),
+            item("s1", "shorts", "p1", FOLDER),
+            item("v1", "clip.mp4", "s1", md5Checksum="abc", size="10"),
+        ],
+        "0",
+    )
+    return mirror
+
+
+def test_reset_resolve_and_children(mirror):
+    assert mirror.is_warm() and mirror.is_warm(max_age=60)
+    assert mirror.resolve("projects") == "root"
+    assert mirror.resolve("projects/alpha/shorts") == "s1"
+    assert mirror.resolve("projects/missing") is None
+    assert mirror.resolve("other/alpha") is None
+    assert mirror.children("s1") == [
+        {"id": "v1", "name": "clip.mp4", "mimeType": "video/mp4", "md5Checksum": "abc", "size": "10"}
+    ]
+    assert mirror.children("p1", folders_only=True)[0]["id"] == "s1"
+
+
+def test_apply_changes_add_rename_move_and_trash(mirror):
+    feed = FakeChanges()
+    feed.queued = [
+        # Reported before the folder that contains it
+        {"fileId": "v2", "file": item("v2", "new.mp4", "p2")},
+        {"fileId": "p2", "file": item("p2", "beta", "root", FOLDER)},
+        {"fileId": "p1", "file": item("p1", "alpha-renamed", "root", FOLDER)},
+        {"fileId": "s1", "file": item("s1", "shorts", "elsewhere", FOLDER)},
+        {"fileId": "x1", "file": item("x1", "unrelated.mp4", "elsewhere")},
+        {"fileId": "v2", "file": item("v2", "new.mp4", "p2", trashed=True)},
+    ]
+    mirror._set_state(mirror._conn(), {"page_token": "0"})
+
+    new_folders = mirror.apply_changes(feed)
+
+    assert new_folders == ["p2"]
+    assert mirror.page_token == "6"
+    assert mirror.resolve("projects/alpha-renamed") == "p1"
+    assert mirror.resolve("projects/alpha") is None
+    assert mirror.resolve("projects/alpha-renamed/shorts") is None
+    assert mirror.children("s1") == []
+    assert mirror.children("p2") == []
+    assert not mirror._has(mirror._conn(), "x1")
+
+
+def test_folder_moved_in_is_reported_for_listing(mirror):
+    feed = FakeChanges()
+    feed.queued = [{"fileId": "p3", "file": item("p3", "gamma", "root", FOLDER)}]
+    assert mirror.apply_changes(feed) == ["p3"]
+    mirror.add_items([item("v3", "clip.mp4", "p3")])
+    assert [c["id"] for c in mirror.children(mirror.resolve("projects/gamma"))] == ["v3"]
+
+
+def test_changes_to_the_root_keep_the_tree(mirror):
+    feed = FakeChanges()
+    feed.queued = [{"fileId": "root", "file": item("root", "projects", "my-drive", FOLDER)}]
+    assert mirror.apply_changes(feed) == []
+    assert mirror.is_warm()
+    assert [c["name"] for c in mirror.children("root")] == ["alpha"]
+
+
+def test_trashed_root_forces_a_full_listing(mirror):
+    feed = FakeChanges()
+    feed.queued = [
+        {"fileId": "root", "file": item("root", "projects", "my-drive", FOLDER, trashed=True)}
+    ]
+    assert mirror.apply_changes(feed) == []
+    assert not mirror.is_warm()
+    assert mirror.children("root") == []
+
+
+def test_apply_changes_requires_initial_listing(tmp_path: Path):
+    mirror = drive_mirror.DriveMirror(str(tmp_path / "mirror.db"))
+    assert not mirror.is_warm()
+    with pytest.raises(RuntimeError):
+        mirror.apply_changes(FakeChanges())
@@ -0,0 +1,81 @@
+from pathlib import Path
+import importlib.util
+import json
+import types
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1].parent
+spec = importlib.util.spec_from_file_location("metrics", ROOT / "app" / "metrics.py")
+metrics = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(metrics)
+
+
+@pytest.fixture(autouse=True)
+def enabled():
+    metrics.configure(True)
+    yield
+    metrics.configure(False)
+    metrics.reset()
+
+
+def test_disabled_records_nothing():
+    metrics.configure(False)
+    metrics.inc("calls_total")
+    metrics.observe("call_seconds", 0.1)
+    with metrics.timer("call_seconds"):
+        pass
+    assert metrics.render() == "\n"
+
+
+def test_render_prometheus_text():
+    metrics.inc("drive_list_pages_total")
+    metrics.inc("drive_list_pages_total", 2)
+    metrics.set_gauge("queue_depth", 3, queue='up"loads')
+    metrics.observe("call_seconds", 0.02, op="list")
+    metrics.observe("call_seconds", 1000, op="list")
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE drive_list_pages_total counter" in lines
+    assert "drive_list_pages_total 3" in lines
+    assert 'queue_depth{queue="up\\"loads"} 3' in lines
+    assert "# TYPE call_seconds histogram" in lines
+    assert 'call_seconds_bucket{op="list",le="0.01"} 0' in lines
+    assert 'call_seconds_bucket{op="list",le="0.025"} 1' in lines
+    assert 'call_seconds_bucket{op="list",le="300"} 1' in lines
+    assert 'call_seconds_bucket{op="list",le="+Inf"} 2' in lines
+    assert 'call_seconds_count{op="list"} 2' in lines
+    assert 'call_seconds_sum{op="list"} 1000.02' in lines
+
+
+def test_render_keeps_full_precision():
+    metrics.inc("drive_download_bytes_total", 4123456789)
+    metrics.set_gauge("drive_rate_limit_per_second", 12.3456789)
+
+    lines = metrics.render().splitlines()
+    assert "drive_download_bytes_total 4123456789" in lines
+    assert "drive_rate_limit_per_second 12.3456789" in lines
+
+
+def test_instrument_times_module_functions_once():
+    module = types.SimpleNamespace(save=lambda value: value * 2)
+    metrics.instrument(module, ["save", "missing"], "models_call_seconds")
+    wrapped = module.save
+    metrics.instrument(module, ["save"], "models_call_seconds")
+    assert module.save is wrapped
+    assert module.save(21) == 42
+    assert 'models_call_seconds_count{op="save"} 1' in metrics.render().splitlines()
+
+
+def test_snapshots_from_other_processes_are_merged(tmp_path: Path):
+    metrics.configure(True, str(tmp_path))
+    metrics.inc("tasks_total", 2)
+    metrics.set_gauge("in_progress", 1)
+    other = metrics._snapshot()
+    other["pid"] = 1
+    (tmp_path / "1.json").write_text(json.dumps(other))
+
+    lines = metrics.render().splitlines()
+    assert "tasks_total 4" in lines
+    assert 'in_progress{pid="1"} 1' in lines
+    metrics.write_snapshot(force=True)
+    assert len(list(tmp_path.glob("*.json"))) == 2
@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import importlib.util
+import sqlite3
+import threading
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1].parent
+spec = importlib.util.spec_from_file_location("models", ROOT / "app" / "models.py")
+models = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(models)
+
+
+@pytest.fixture(autouse=True)
+def db_path(tmp_path: Path, monkeypatch):
+    path = tmp_path / "app.db"
+    monkeypatch.setattr(models, "DB_PATH", str(path))
+    yield path
+    models.close_db()
+
+
+def test_project_round_trip():
+    project_id = models.save_project("folder-1", "Demo", {"channel": "main"})
+    project = models.get_project(project_id)
+    assert project["folder_id"] == "folder-1"
+    assert project["metadata"] == {"channel": "main"}
+    assert models.get_project(project_id + 1) is None
+
+
+def test_schedules_ordered_by_time():
+    project_id = models.save_project("folder-1", "Demo")
+    start = datetime(2024, 1, 1, 9, 0)
+    models.add_schedule(project_id, start + timedelta(days=1), {"slot": 2})
+    models.add_schedule(project_id, start, {"slot": 1})
+    slots = [s["metadata"]["slot"] for s in models.get_schedules(project_id)]
+    assert slots == [1, 2]
+
+
+def test_wal_enabled_and_connection_reused(db_path: Path):
+    conn = models._get_conn()
+    models.save_project("folder-1", "Demo")
+    assert models._get_conn() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_connections_are_per_thread():
+    main_conn = models._get_conn()
+    seen = []
+
+    def worker():
+        seen.append(models._get_conn())
+        models.save_project("folder-2", "Threaded")
+        models.close_db()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert seen and seen[0] is not main_conn
+    assert models.get_project(1)["name"] == "Threaded"
+
+
+def test_bulk_schedules():
+    first = models.save_project("folder-1", "One")
+    second = models.save_project("folder-2", "Two")
+    start = datetime(2024, 1, 1, 9, 0)
+    slots = [start + timedelta(days=d) for d in reversed(range(30))]
+    assert models.add_schedules(first, slots) == 30
+    assert models.add_schedules(second, [(start, {"slot": "a"})]) == 1
+
+    result = models.get_schedules_for_projects([first, second, 999])
+    assert [s["scheduled_at"] for s in result[first]] == sorted(
+        s.isoformat() for s in slots
+    )
+    assert result[second][0]["metadata"] == {"slot": "a"}
+    assert result[999] == []
+
+
+def test_migrations_create_indexes_once():
+    conn = models._get_conn()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == models.SCHEMA_VERSION
+    indexes = {
+        row["name"]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    }
+    assert {"idx_schedules_project_time", "idx_schedules_time"} <= indexes
+    plan = " ".join(
+        row[-1]
+        for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM schedules "
+            "WHERE project_id = ? ORDER BY scheduled_at",
+            (1,),
+        )
+    )
+    assert "idx_schedules_project_time" in plan
+
+
+def test_migration_marks_existing_schedules_dispatched(db_path: Path):
+    now = datetime.now()
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            folder_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            metadata TEXT
+        );
+        CREATE TABLE schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            scheduled_at TEXT NOT NULL,
+            metadata TEXT,
+            FOREIGN KEY(project_id) REFERENCES projects(id)
+        );
+        INSERT INTO projects (folder_id, name) VALUES ('folder-1', 'Legacy');
+        """
+    )
+    conn.executemany(
+        "INSERT INTO schedules (project_id, scheduled_at) VALUES (1, ?)",
+        [((now - timedelta(days=1)).isoformat(),), ((now + timedelta(days=1)).isoformat(),)],
+    )
+    conn.commit()
+    conn.close()
+
+    # The old code published future slots too, so nothing is pending
+    assert models.claim_due_schedules(now + timedelta(days=2)) == []
+    assert models.reclaim_stale_schedules(now + timedelta(days=2)) == []
+    assert {s["task_id"] for s in models.get_schedules(1)} == {models.LEGACY_TASK_ID}
+    assert models._get_conn().execute("PRAGMA user_version").fetchone()[0] == models.SCHEMA_VERSION
+
+    models.requeue_schedules([2])
+    claimed = models.claim_due_schedules(now + timedelta(days=2))
+    assert [s["scheduled_at"] for s in claimed] == [(now + timedelta(days=1)).isoformat()]
+
+
+def test_claim_due_schedules_claims_each_row_once():
+    project_id = models.save_project("folder-1", "Demo")
+    now = datetime(2024, 1, 1, 9, 0)
+    models.add_schedules(project_id, [now - timedelta(minutes=1), now, now + timedelta(days=7)])
+
+    claimed = models.claim_due_schedules(now + timedelta(minutes=5), project_id=project_id)
+    assert [s["scheduled_at"] for s in claimed] == [
+        (now - timedelta(minutes=1)).isoformat(),
+        now.isoformat(),
+    ]
+    assert all(s["dispatched_at"] for s in claimed)
+    assert models.claim_due_schedules(now + timedelta(minutes=5)) == []
+    assert len(models.claim_due_schedules(now + timedelta(days=8))) == 1
+
+
+def test_release_only_unpublished_schedules():
+    project_id = models.save_project("folder-1", "Demo")
+    now = datetime(2024, 1, 1, 9, 0)
+    models.add_schedules(project_id, [now, now + timedelta(minutes=1)])
+    first, second = models.claim_due_schedules(now + timedelta(minutes=5))
+
+    models.mark_schedules_published({first["id"]: "task-1"})
+    models.release_schedules([first["id"], second["id"]])
+
+    reclaimed = models.claim_due_schedules(now + timedelta(minutes=5))
+    assert [s["id"] for s in reclaimed] == [second["id"]]
+    assert models.get_schedules(project_id)[0]["task_id"] == "task-1"
+
+
+def test_reclaim_stale_schedules_returns_unpublished_claims():
+    project_id = models.save_project("folder-1", "Demo")
+    now = datetime(2024, 1, 1, 9, 0)
+    models.add_schedules(project_id, [now, now + timedelta(minutes=1)])
+    first, second = models.claim_due_schedules(now + timedelta(minutes=5))
+    models.mark_schedules_published({first["id"]: "task-1"})
+
+    claimed_at = datetime.fromisoformat(second["dispatched_at"])
+    assert models.reclaim_stale_schedules(claimed_at) == []
+    reclaimed = models.reclaim_stale_schedules(claimed_at + timedelta(seconds=1))
+    assert [s["id"] for s in reclaimed] == [second["id"]]
+    # Reclaimed rows are re-stamped, so they are not reclaimed again at once
+    assert models.reclaim_stale_schedules(claimed_at) == []
+
+
+def test_asset_index_finds_duplicates_across_projects():
+    project_id = models.save_project("folder-a", "A")
+    listed = [
+        {"id": "f1", "name": "clip.mp4", "md5Checksum": "abc", "size": "10"},
+        {"id": "d1", "name": "sub", "mimeType": "application/vnd.google-apps.folder"},
+    ]
+    assert models.record_assets(listed, "folder-a") == 1
+    models.record_assets([{"id": "f2", "name": "copy.mp4", "md5Checksum": "abc", "size": "10"}])
+
+    found = {a["drive_file_id"]: a for a in models.find_assets("abc", 10)}
+    assert set(found) == {"f1", "f2"}
+    assert found["f1"]["project_id"] == project_id
+    assert found["f2"]["project_id"] is None
+
+    plan = " ".join(
+        row[-1]
+        for row in models._get_conn().execute(
+            "EXPLAIN QUERY PLAN SELECT projects.id FROM assets "
+            "LEFT JOIN projects ON projects.folder_id = assets.project_folder_id "
+            "WHERE assets.md5_checksum = ? AND assets.size = ?",
+            ("abc", 10),
+        )
+    )
+    assert "idx_assets_content" in plan and "idx_projects_folder" in plan
+
+    assert models.find_upload("abc", 10, "youtube") is None
+    models.record_upload("abc", 10, "youtube", {"video_id": "yt1"})
+    assert models.find_upload("abc", 10, "youtube")["result"] == {"video_id": "yt1"}
+    assert models.find_upload("abc", 10, "tiktok") is None
@@ -0,0 +1,76 @@
+from pathlib import Path
+import sys
+import time
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1].parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+flask = pytest.importorskip("flask")
+pytest.importorskip("googleapiclient")
+projects = pytest.importorskip("app.views.projects")
+
+
+@pytest.fixture
+def folders(monkeypatch):
+    listed = [{"id": f"id{i}", "name": f"project{i}"} for i in range(5)]
+    monkeypatch.setattr(projects, "list_folders", lambda path: list(listed))
+    monkeypatch.setattr(projects, "project_cache", projects.ProjectListCache())
+    return listed
+
+
+@pytest.fixture
+def client():
+    app = flask.Flask(__name__)
+    app.config.update(PROJECTS_DRIVE_PATH="projects", PROJECTS_CACHE_TTL=60)
+    app.register_blueprint(projects.projects_bp)
+    return app.test_client()
+
+
+def wait_for_refresh(timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while projects.project_cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_conditional_requests_get_not_modified(client, folders):
+    first = client.get("/api/projects")
+    assert first.status_code == 200
+    assert first.get_json() == folders
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+
+    second = client.get("/api/projects", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.data == b""
+
+
+def test_stale_listing_served_while_refreshing(client, folders):
+    client.application.config["PROJECTS_CACHE_TTL"] = -1
+    first = client.get("/api/projects")
+    folders.append({"id": "id5", "name": "project5"})
+
+    # The stale listing is answered at once and refreshed in the background
+    stale = client.get("/api/projects")
+    assert stale.get_json() == first.get_json()
+    wait_for_refresh()
+    fresh = client.get("/api/projects")
+    assert fresh.get_json() == folders
+    assert fresh.headers["ETag"] != first.headers["ETag"]
+    wait_for_refresh()
+
+
+def test_pagination(client, folders):
+    first = client.get("/api/projects?limit=2")
+    assert first.get_json() == folders[:2]
+    assert first.headers["X-Next-Page-Token"] == "2"
+
+    last = client.get("/api/projects?limit=2&page_token=4")
+    assert last.get_json() == folders[4:]
+    assert "X-Next-Page-Token" not in last.headers
+    assert last.headers["ETag"] != first.headers["ETag"]
+
+    negative = client.get("/api/projects?limit=2&page_token=-3")
+    assert negative.get_json() == folders[:2]
+    assert negative.headers["X-Next-Page-Token"] == "2"
@@ -0,0 +1,118 @@
+from pathlib import Path
+import importlib.util
+import json
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1].parent
+spec = importlib.util.spec_from_file_location("ratelimit", ROOT / "app" / "ratelimit.py")
+ratelimit = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ratelimit)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class Resp(dict):
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status, reason=None, headers=None):
+        self.resp = Resp(status, headers)
+        errors = [{"reason": reason}] if reason else []
+        self.content = json.dumps({"error": {"code": status, "errors": errors}}).encode()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(tmp_path: Path, clock):
+    return ratelimit.RateLimiter(str(tmp_path / "ratelimit.db"), initial_rate=10.0, burst=5.0)
+
+
+def test_is_rate_limited():
+    assert ratelimit.is_rate_limited(FakeHttpError(429))
+    assert ratelimit.is_rate_limited(FakeHttpError(403, "userRateLimitExceeded"))
+    assert not ratelimit.is_rate_limited(FakeHttpError(403, "insufficientPermissions"))
+    assert not ratelimit.is_rate_limited(FakeHttpError(500))
+    assert not ratelimit.is_rate_limited(None)
+
+
+def test_burst_then_paced(limiter, clock):
+    for _ in range(5):
+        limiter.acquire()
+    assert clock.slept == []
+    limiter.acquire()
+    assert len(clock.slept) == 1 and 0.1 <= clock.slept[0] <= 0.125
+
+
+def test_bucket_shared_between_limiters(limiter, clock, tmp_path: Path):
+    other = ratelimit.RateLimiter(str(tmp_path / "ratelimit.db"), initial_rate=10.0, burst=5.0)
+    for _ in range(3):
+        limiter.acquire()
+    for _ in range(2):
+        other.acquire()
+    assert clock.slept == []
+    other.acquire()
+    assert clock.slept
+
+
+def test_call_backs_off_and_adapts_rate(limiter, clock):
+    outcomes = [FakeHttpError(429), FakeHttpError(403, "rateLimitExceeded", {"retry-after": "7"})]
+
+    def func():
+        if outcomes:
+            raise outcomes.pop(0)
+        return "ok"
+
+    assert limiter.call(func) == "ok"
+    assert limiter.stats()["rate"] in (2.5, 5.0)
+    assert sum(clock.slept) >= 7
+    rate = limiter.stats()["rate"]
+
+    for _ in range(20):
+        limiter.call(lambda: None)
+    limiter.acquire()
+    assert limiter.stats()["rate"] > rate
+    assert limiter.stats()["strikes"] == 0
+
+
+def test_simultaneous_rejections_decrease_rate_once(limiter):
+    limiter.throttled()
+    limiter.throttled()
+    stats = limiter.stats()
+    assert stats["rate"] == 5.0
+    assert stats["tokens"] == 0 and stats["blocked_for"] > 0
+
+
+def test_call_gives_up_and_passes_other_errors(limiter):
+    with pytest.raises(FakeHttpError):
+        limiter.call(lambda: (_ for _ in ()).throw(FakeHttpError(404)))
+
+    attempts = []
+
+    def always_throttled():
+        attempts.append(1)
+        raise FakeHttpError(429)
+
+    with pytest.raises(FakeHttpError):
+        limiter.call(always_throttled)
+    assert len(attempts) == ratelimit.MAX_ATTEMPTS
+    assert limiter.stats()["rate"] >= limiter.min_rate
@@ -0,0 +1,91 @@
+from pathlib import Path
+import importlib.util
+import subprocess
+import sys
+
+ROOT = Path(__file__).resolve().parents[1].parent
+spec = importlib.util.spec_from_file_location("staging", ROOT / "app" / "staging.py")
+staging = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(staging)
+
+
+def writer(data: bytes, calls: list):
+    def download(path: str) -> None:
+        calls.append(path)
+        Path(path).write_bytes(data)
+
+    return download
+
+
+def test_fetch_links_cached_objects(tmp_path: Path):
+    cache = staging.StagingCache(str(tmp_path / "cache"), budget_bytes=1000)
+    calls: list = []
+    first = tmp_path / "project-a" / "video.mp4"
+    second = tmp_path / "project-b" / "video.mp4"
+
+    assert cache.fetch("aa11", str(first), writer(b"clip", calls)) is False
+    assert cache.fetch("aa11", str(second), writer(b"clip", calls)) is True
+    assert len(calls) == 1
+    assert second.read_bytes() == b"clip"
+    assert second.stat().st_ino == first.stat().st_ino
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["objects"]) == (1, 1, 1)
+
+
+def test_lru_eviction_skips_pinned_objects(tmp_path: Path):
+    cache = staging.StagingCache(str(tmp_path / "cache"), budget_bytes=250)
+    calls: list = []
+    with cache.pin(["aa01"]):
+        cache.fetch("aa01", str(tmp_path / "p" / "1"), writer(b"x" * 100, calls))
+        cache.fetch("aa02", str(tmp_path / "p" / "2"), writer(b"x" * 100, calls))
+        cache.fetch("aa03", str(tmp_path / "p" / "3"), writer(b"x" * 100, calls))
+
+    assert Path(cache.object_path("aa01")).exists()
+    assert not Path(cache.object_path("aa02")).exists()
+    assert Path(cache.object_path("aa03")).exists()
+    assert cache.stats()["evictions"] == 1
+    # Linked project copies survive eviction of the cache entry
+    assert (tmp_path / "p" / "2").read_bytes() == b"x" * 100
+
+
+def test_failed_download_leaves_no_partial_object(tmp_path: Path):
+    cache = staging.StagingCache(str(tmp_path / "cache"), budget_bytes=1000)
+    paths: list = []
+
+    def broken(path: str) -> None:
+        paths.append(path)
+        Path(path).write_bytes(b"partial")
+        raise OSError("connection reset")
+
+    try:
+        cache.fetch("aa11", str(tmp_path / "p" / "1"), broken)
+    except OSError:
+        pass
+    calls: list = []
+    assert cache.fetch("aa11", str(tmp_path / "p" / "1"), writer(b"clip", calls)) is False
+    assert calls[0] != paths[0]
+    assert list((tmp_path / "cache" / "incoming").iterdir()) == []
+    assert (tmp_path / "p" / "1").read_bytes() == b"clip"
+
+
+def test_pins_of_dead_processes_are_released(tmp_path: Path):
+    cache = staging.StagingCache(str(tmp_path / "cache"), budget_bytes=150)
+    calls: list = []
+    cache.fetch("aa01", str(tmp_path / "p" / "1"), writer(b"x" * 100, calls))
+    # Leave a pin behind for a process that has already exited
+    child = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    conn = cache._connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO pins (md5, pid, refs) VALUES ('aa01', ?, 1)", (int(child.stdout),)
+        )
+    conn.close()
+
+    cache.fetch("aa02", str(tmp_path / "p" / "2"), writer(b"x" * 100, calls))
+    assert not Path(cache.object_path("aa01")).exists()
+    assert Path(cache.object_path("aa02")).exists()
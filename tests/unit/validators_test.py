@@ -57,8 +57,98 @@ def test_schema_errors(tmp_path: Path):
     assert any("description" in e.lower() for e in errors)
 
 
+def test_missing_fields_reported_in_sorted_order(tmp_path: Path):
+    video_dir = tmp_path / "video1"
+    create_valid_video(video_dir)
+    meta_path = video_dir / "metadata.json"
+    meta_path.write_text("{}")
+    assert validate_project(tmp_path) == [
+        f"Metadata missing field '{field}' in {meta_path}" for field in ("description", "title")
+    ]
+
+
 def test_nested_shorts(tmp_path: Path):
     nested = tmp_path / "shorts" / "a" / "shorts" / "b"
     create_valid_video(nested)
     errors = validate_project(tmp_path)
     assert any("nested shorts" in e.lower() for e in errors)
+
+
+def test_errors_in_deterministic_order(tmp_path: Path):
+    for i in range(20):
+        video_dir = tmp_path / f"video{i:02d}"
+        video_dir.mkdir()
+        (video_dir / "video.mp4").write_text("dummy")
+        (video_dir / "metadata.json").write_text(json.dumps({"title": "t", "description": "d"}))
+    errors = validate_project(tmp_path)
+    assert errors == [f"Missing thumbnail in {tmp_path / f'video{i:02d}'}" for i in range(20)]
+    assert validate_project(tmp_path, max_workers=1) == errors
+
+
+def test_incremental_validation_reuses_unchanged_items(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(validators, "CACHE_DB_PATH", str(tmp_path / "cache.db"))
+    project = tmp_path / "project"
+    for name in ("video1", "video2"):
+        create_valid_video(project / name)
+    assert validate_project(project, incremental=True) == []
+
+    checked = []
+    original = validators._check_item
+
+    def spy(dir_path, files):
+        checked.append(dir_path.name)
+        return original(dir_path, files)
+
+    monkeypatch.setattr(validators, "_check_item", spy)
+    (project / "video2" / "thumbnail.jpg").unlink()
+    errors = validate_project(project, incremental=True)
+    assert checked == ["video2"]
+    assert errors == [f"Missing thumbnail in {project / 'video2'}"]
+    assert validate_project(project, incremental=True) == errors
+    assert checked == ["video2"]
+
+
+def mp4_bytes(duration_s: int = 5, timescale: int = 1000, mvhd_size=None) -> bytes:
+    import struct
+
+    ftyp = struct.pack(">I4s4sI4s", 20, b"ftyp", b"isom", 0, b"mp42")
+    mvhd_body = struct.pack(">B3xIIII", 0, 0, 0, timescale, duration_s * timescale) + bytes(80)
+    if mvhd_size is not None:
+        mvhd_body = mvhd_body[:mvhd_size - 8]
+    mvhd = struct.pack(">I4s", 8 + len(mvhd_body), b"mvhd") + mvhd_body
+    moov = struct.pack(">I4s", 8 + len(mvhd), b"moov") + mvhd
+    mdat = struct.pack(">I4s", 8 + 64, b"mdat") + bytes(64)
+    return ftyp + moov + mdat
+
+
+def test_probe_mp4(tmp_path: Path):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(mp4_bytes(duration_s=7))
+    info = validators.probe_mp4(video)
+    assert info.duration == 7.0
+    assert info.size == video.stat().st_size
+
+    video.write_bytes(mp4_bytes()[:-10])
+    with pytest.raises(ValueError, match="extends past the end"):
+        validators.probe_mp4(video)
+
+
+def test_container_check_reports_truncated_video(tmp_path: Path):
+    video_dir = tmp_path / "video1"
+    create_valid_video(video_dir)
+    assert validate_project(tmp_path, check_containers=False) == []
+    errors = validate_project(tmp_path, check_containers=True)
+    assert errors and errors[0].startswith(f"Corrupt .mp4 file {video_dir / 'video.mp4'}")
+
+    (video_dir / "video.mp4").write_bytes(mp4_bytes())
+    assert validate_project(tmp_path, check_containers=True) == []
+
+
+def test_container_check_reports_truncated_mvhd(tmp_path: Path):
+    video = tmp_path / "video1" / "video.mp4"
+    create_valid_video(video.parent)
+    video.write_bytes(mp4_bytes(mvhd_size=12))
+    with pytest.raises(ValueError, match="truncated 'mvhd' box"):
+        validators.probe_mp4(video)
+    errors = validate_project(tmp_path, check_containers=True)
+    assert errors and errors[0].startswith(f"Corrupt .mp4 file {video}")